@@ -2,10 +2,14 @@
 from gevent import monkey
 monkey.patch_all()
 
+import time
+_boot_started = time.perf_counter()
+
 import os
 import psutil
 import signal
-import sys
+import logging
+import gevent
 from flask import Flask, request, jsonify
 from flask_socketio import SocketIO
 from config import Config
@@ -13,14 +17,38 @@ from routes import register_routes
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from logger import app_logger
+from services.sdk_loader import record_boot
+from services.lifecycle_service import drain, load_pending_jobs
+from services.batch_service import resume_jobs
+
+# 終了時に完了しなかったジョブを保存するフォルダ（UPLOAD_FOLDER からの相対パス）
+PENDING_SUBDIR = '_pending'
+
+_shutdown_requested = False
 
-def signal_handler(sig, frame):
+def signal_handler():
+    global _shutdown_requested
+    if _shutdown_requested:
+        # 2回目のシグナルでは待機せずに終了する
+        app_logger.warning('Received second shutdown signal, exiting immediately')
+        logging.shutdown()
+        os._exit(1)
+    _shutdown_requested = True
     app_logger.info('Shutting down gracefully...')
-    # ここに必要なクリーンアップ処理を追加
-    sys.exit(0)
+    gevent.spawn(drain_and_exit)
+
+def drain_and_exit():
+    """新しいアップロードの受け付けを止め、実行中の処理の完了を待ってから終了する"""
+    pending_dir = os.path.join(app.config['UPLOAD_FOLDER'], PENDING_SUBDIR)
+    try:
+        drain(pending_dir, notify=socketio.emit)
+    except Exception as e:
+        app_logger.error(f"Error while draining: {str(e)}", exc_info=True)
+    logging.shutdown()
+    os._exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
+gevent.signal_handler(signal.SIGINT, signal_handler)
+gevent.signal_handler(signal.SIGTERM, signal_handler)
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -67,19 +95,20 @@ def create_app(config_class=Config):
         app_logger.error(f"Unhandled exception: {str(e)}", exc_info=True)
         return jsonify(error=str(e)), 500
 
-    # Socket.IOイベントハンドラ
-    @socketio.on('connect')
-    def handle_connect():
-        app_logger.info("Client connected")
-
-    @socketio.on('disconnect')
-    def handle_disconnect():
-        app_logger.info("Client disconnected")
-
     return app, socketio
 
 app, socketio = create_app()
 
+def _session_notifier(session_id):
+    """ブラウザのセッションのルーム（接続時に参加する）に通知するコールバックを返す"""
+    if not session_id:
+        return lambda event, data: None
+    return lambda event, data: socketio.emit(event, data, to=session_id)
+
+# 前回の終了時に中断されたジョブを、元のセッションに通知しながら再開する
+resume_jobs(load_pending_jobs(os.path.join(app.config['UPLOAD_FOLDER'], PENDING_SUBDIR)), _session_notifier)
+record_boot(time.perf_counter() - _boot_started)
+
 if __name__ == '__main__':
     port = int(os.getenv("PORT", 5000))
     app_logger.info(f"Starting server on port {port}")
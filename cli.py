@@ -0,0 +1,131 @@
+# cli.py
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import concurrent.futures
+from dotenv import load_dotenv
+from logger import app_logger
+
+# .envファイルの内容を読み込む
+load_dotenv()
+
+# 処理対象とする音声ファイルの拡張子
+AUDIO_EXTENSIONS = {'mp4', 'wav', 'mp3', 'mov'}
+
+# 出力ファイルの接尾辞
+TRANSCRIPT_SUFFIX = '.transcript.txt'
+MINUTES_SUFFIX = '.minutes.md'
+
+def output_paths(input_file):
+    """入力ファイルに対応する文字起こし・議事録の出力パスを返す"""
+    base, _ = os.path.splitext(input_file)
+    return base + TRANSCRIPT_SUFFIX, base + MINUTES_SUFFIX
+
+def is_processed(input_file):
+    """出力ファイルが揃っていて、入力ファイルより新しい場合は処理済みとみなす"""
+    input_mtime = os.path.getmtime(input_file)
+    for path in output_paths(input_file):
+        if not os.path.exists(path) or os.path.getmtime(path) < input_mtime:
+            return False
+    return True
+
+def collect_inputs(paths, recursive=False):
+    """
+    引数で指定されたファイルとディレクトリから処理対象の音声ファイルを収集する
+
+    Args:
+        paths (list): ファイルまたはディレクトリのパス
+        recursive (bool): ディレクトリを再帰的に探索するかどうか
+
+    Returns:
+        list: 音声ファイルのパス（重複なし、ソート済み）
+    """
+    inputs = set()
+    for path in paths:
+        if os.path.isdir(path):
+            if recursive:
+                walker = ((root, names) for root, _, names in os.walk(path))
+            else:
+                walker = [(path, os.listdir(path))]
+            for root, names in walker:
+                for name in names:
+                    candidate = os.path.join(root, name)
+                    if os.path.isfile(candidate) and _has_audio_extension(name):
+                        inputs.add(os.path.abspath(candidate))
+        elif os.path.isfile(path):
+            inputs.add(os.path.abspath(path))
+        else:
+            app_logger.warning(f"Input not found, skipping: {path}")
+    return sorted(inputs)
+
+def _has_audio_extension(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in AUDIO_EXTENSIONS
+
+def process_file(input_file):
+    """
+    1つの音声ファイルを処理し、文字起こしと議事録を入力ファイルの隣に書き出す
+
+    プロセスプールのワーカーから呼び出されるため、モジュールのトップレベルに定義している。
+    """
+    # ワーカープロセスでのみサービスを読み込む
+    from services.pipeline_service import run_pipeline
+    from services.deadline_service import new_job_deadline
+
+    transcript_path, minutes_path = output_paths(input_file)
+    work_dir = tempfile.mkdtemp(prefix='aiscriber_')
+    try:
+        result = run_pipeline(input_file, work_dir, deadline=new_job_deadline())
+        _write_text(transcript_path, result['transcription'])
+        _write_text(minutes_path, result['minutes'])
+        return input_file, f"{result['api_name']}, {result['prompt_version']}", None
+    except Exception as e:
+        app_logger.error(f"Error processing {input_file}: {str(e)}", exc_info=True)
+        return input_file, None, str(e)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def _write_text(path, content):
+    """一時ファイルに書き込んでから置き換え、途中で中断されても不完全な出力を残さない"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='音声ファイルを一括で文字起こしし、議事録を生成します。'
+    )
+    parser.add_argument('paths', nargs='+', help='音声ファイルまたはディレクトリ')
+    parser.add_argument('-r', '--recursive', action='store_true', help='ディレクトリを再帰的に探索する')
+    parser.add_argument('-j', '--workers', type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help='同時に処理するファイル数')
+    parser.add_argument('-f', '--force', action='store_true', help='処理済みのファイルも再処理する')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    inputs = collect_inputs(args.paths, args.recursive)
+    pending = [f for f in inputs if args.force or not is_processed(f)]
+    skipped = len(inputs) - len(pending)
+    app_logger.info(f"Found {len(inputs)} audio files, {skipped} already processed, {len(pending)} to process")
+
+    failures = 0
+    if pending:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+            futures = [executor.submit(process_file, f) for f in pending]
+            for future in concurrent.futures.as_completed(futures):
+                input_file, api_name, error = future.result()
+                if error:
+                    failures += 1
+                    print(f"FAILED  {input_file}: {error}", file=sys.stderr)
+                else:
+                    print(f"DONE    {input_file} ({api_name})")
+
+    print(f"{len(pending) - failures} processed, {skipped} skipped, {failures} failed")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,9 +2,7 @@
 
 import os
 from flask import Flask
-from anthropic import Anthropic
 from dotenv import load_dotenv
-from flaskext.markdown import Markdown
 from logger import app_logger
 
 # .envファイルの内容を読み込む
@@ -48,13 +46,16 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
     app_logger.info("Config applied to app")
     
-    # Markdownの設定
+    # Markdownの設定（使用する場合のみ読み込む）
+    from flaskext.markdown import Markdown
     Markdown(app)
     app_logger.info("Markdown configured")
     
-    # Anthropic APIクライアントの初期化
-    app.anthropic = Anthropic(api_key=app.config['ANTHROPIC_API_KEY'])
-    app_logger.info("Anthropic API client initialized")
+    # Anthropic APIクライアントの初期化（APIキーが設定されている場合のみSDKを読み込む）
+    if app.config['ANTHROPIC_API_KEY']:
+        from services.sdk_loader import load_sdk
+        app.anthropic = load_sdk('claude').Anthropic(api_key=app.config['ANTHROPIC_API_KEY'])
+        app_logger.info("Anthropic API client initialized")
     
     # アップロードフォルダの作成
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -1,19 +1,45 @@
 # routes.py
 
+import hmac
 import json
 import uuid
 import os
 import datetime
-from flask import render_template, request, jsonify, session, render_template_string, current_app, g
-from services.minutes_service import generate_minutes
-from services.gemni_miniutes_service import gemini_generate_minutes
-from services.openai_miniutes_service import openai_generate_minutes
-from services.file_service import prepare_download_file, create_download_file
-from services.upload_service import process_upload
+from flask import render_template, request, jsonify, session, current_app, g, send_file, Response, stream_with_context
+from flask_socketio import emit, join_room
+from services.pipeline_service import generate_minutes_with_fallback, render_minutes_html
+from services.export_service import normalize_format, render_export, send_export, ExportUnavailableError
+from services.upload_service import process_upload, save_upload, allowed_file
+from services.batch_service import submit_batch, get_batch_status, get_batch_session
+from services.sdk_loader import get_import_report
+from services.transcript_store import (
+    load_transcript, transcript_text, retranscribe, failed_segment_indexes, segment_indexes_for_range,
+    update_segment_texts, save_minutes, load_minutes
+)
+from services.regeneration_service import regenerate_incremental
+from services.deadline_service import new_job_deadline, JobCancelledError
+from services.live_service import start_live, add_chunk, stop_live, stop_live_for_owner, LiveSessionError
+from services.storage_service import StorageError
+from services.archive_service import archive_meeting, search
+from services.routing_service import PROVIDERS
+from services.profiling_service import (
+    should_profile, start_profile, stop_profile, update_settings, get_settings,
+    dump_greenlets, list_profiles, profile_stage_path
+)
+from services.lifecycle_service import (
+    is_draining, get_drain_status, cancel_job, cancel_jobs_for_owner, is_job_owner, get_job, get_resumed
+)
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from logger import app_logger
 
+# 管理用エンドポイントの認証に使用するトークン（未設定の場合は管理用エンドポイントを無効にする）
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# /transcripts/<transcript_id>/segments で1回に返すセグメント数
+SEGMENT_PAGE_DEFAULT_LIMIT = 50
+SEGMENT_PAGE_MAX_LIMIT = 500
+
 # グローバル変数で利用回数を追跡
 usage_count = 0
 last_reset = datetime.datetime.now().date()
@@ -50,6 +76,8 @@ def register_routes(app, socketio):
         global usage_count
         app_logger.info(f"Request to upload_file. Method: {request.method}")
         if request.method == 'POST':
+            if is_draining():
+                return _draining_response()
             app_logger.info("Processing POST request for file upload")
             file = request.files.get('file')
             
@@ -58,25 +86,43 @@ def register_routes(app, socketio):
             os.makedirs(upload_dir, exist_ok=True)
             app_logger.info(f"Upload directory created: {upload_dir}")
             
-            transcription, minutes_html, error = process_upload(
-                file, 
-                upload_dir, 
-                current_app.config['ALLOWED_EXTENSIONS'], 
-                socketio
-            )
+            # 管理者が X-Profile ヘッダーなどで要求した場合は処理のステージごとにスタックを採取する
+            profiling = should_profile(request.headers, request.args, allow_request=_is_admin())
+            profile = start_profile(f"upload {file.filename if file else ''}") if profiling else None
+            try:
+                transcription, minutes, minutes_html, prompt_version, transcript_id, error = process_upload(
+                    file, 
+                    upload_dir, 
+                    current_app.config['ALLOWED_EXTENSIONS'], 
+                    _notifier(request.form.get('sid')),
+                    owner=request.form.get('sid'),
+                    session_id=session['session_id']
+                )
+            finally:
+                if profile:
+                    stop_profile(profile)
             
             if error:
                 app_logger.error(f"Error in file processing: {error}")
                 return render_template('index.html', message=error, transcription="", minutes="")
+
+            session['minutes'] = minutes
+            session['prompt_version'] = prompt_version
+            session['transcript_id'] = transcript_id
             
             # 利用回数をインクリメント
             usage_count += 1
             app_logger.info(f"Usage count incremented. Current count: {usage_count}")
             
+            headers = {'ContentType':'application/json'}
+            if profile:
+                headers['X-Profile-Id'] = profile.profile_id
+            # 文字起こしは長くなるため、/transcripts/<transcript_id>/stream から順次取得する
             return json.dumps({
-                'transcription': transcription, 
-                'minutes_html': minutes_html
-            }), 200, {'ContentType':'application/json'}
+                'minutes_html': minutes_html,
+                'prompt_version': prompt_version,
+                'transcript_id': transcript_id
+            }), 200, headers
         
         app_logger.info("Rendering index.html for GET request")
         return render_template('index.html', transcription="", minutes="")
@@ -86,48 +132,301 @@ def register_routes(app, socketio):
     def regenerate_minutes():
         global usage_count
         app_logger.info("Request to regenerate minutes")
-        data = request.json
+        data = request.get_json(silent=True) or {}
+        transcript_id = data.get('transcript_id') or session.get('transcript_id')
+        # 保存された文字起こし・議事録の読み込みと更新は、それを作成したブラウザのセッションからのみ受け付ける
+        record = _load_owned_transcript(transcript_id) if transcript_id else None
+        if record is None and data.get('transcript_id'):
+            app_logger.warning(f"Transcript {transcript_id} not found or not owned by this session")
+            return jsonify({'error': '文字起こしが見つかりません'}), 404
+        if record is None:
+            transcript_id = None
+        notify = _notifier(data.get('sid'))
+        # incremental: 保存された議事録のうち、修正の影響を受けた部分だけを更新する / full: 全体を再生成する
+        mode = data.get('mode', 'incremental')
+        if mode not in ('incremental', 'full'):
+            return jsonify({'error': 'mode には incremental または full を指定してください'}), 400
+
+        # 保存された文字起こしを使用し、利用者が修正したセグメント（edits: {番号: テキスト}）だけを受け取る。
+        # transcription を指定した場合はそのテキストを使用する
         transcription = data.get('transcription', '')
+        segment_texts = None
+        edits = data.get('edits') or {}
+        if not isinstance(edits, dict):
+            return jsonify({'error': 'edits にはセグメント番号とテキストの組を指定してください'}), 400
+        if not transcription and record is not None:
+            if edits:
+                try:
+                    record = update_segment_texts(transcript_id, edits)
+                except ValueError:
+                    return jsonify({'error': '存在しないセグメントが指定されました'}), 400
+            if record is not None:
+                transcription = transcript_text(record)
+                segment_texts = [segment['text'] for segment in record['segments']]
+                if edits:
+                    archive_meeting(transcript_id, transcription=transcription)
         
-        if not transcription:
+        if not transcription.strip():
             app_logger.warning("No transcription provided for regenerating minutes")
             return jsonify({'error': '文字起こしテキストが提供されていません'}), 400
 
         try:
-            # 議事録の生成 (Gemini, OpenAI, Claude の順に試行)
-            for generate_func, api_name in [
-                (gemini_generate_minutes, "Gemini API"), 
-                (openai_generate_minutes, "ChatGPT API"), 
-                (generate_minutes, "Claude API")
-            ]:
-                app_logger.info(f"Attempting to generate minutes using {api_name}")
-                socketio.emit('status_update', {'status': f'{api_name} を使用して議事録を生成中...'})
-                minutes = generate_func(transcription)
-                if minutes and minutes != "議事録の生成中にエラーが発生しました。":
-                    # 議事録生成成功
-                    app_logger.info(f"Minutes successfully generated using {api_name}")
-                    socketio.emit('api_used', {'api_name': api_name}) # 使用したAPI名を送信
-                    break
+            previous = load_minutes(transcript_id) if transcript_id and mode == 'incremental' else None
+            if previous:
+                result = regenerate_incremental(previous['minutes'], previous['source_transcription'],
+                                                transcription, notify)
+                minutes = result['minutes']
+                api_name = result['api_name'] or previous.get('api_name')
+                prompt_version = result['prompt_version'] or previous.get('prompt_version')
+                regenerated = result['mode']
+                sections = result['sections']
             else:
-                # 全てのツールで失敗
-                raise Exception("全ての議事録生成ツールでエラーが発生しました。")
+                # 議事録の生成 (Gemini, OpenAI, Claude の順に試行)
+                minutes, api_name, prompt_version = generate_minutes_with_fallback(transcription, notify,
+                                                                                   segments=segment_texts)
+                regenerated, sections = 'full', []
+            app_logger.info(f"Minutes regenerated (mode: {regenerated}, sections: {sections})")
             
             # セッションに議事録を保存
             session['minutes'] = minutes
+            session['prompt_version'] = prompt_version
             app_logger.info("Minutes saved to session")
+
+            if transcript_id:
+                save_minutes(transcript_id, minutes, transcription, api_name, prompt_version)
+                archive_meeting(transcript_id, transcription=transcription, minutes=minutes, api_name=api_name,
+                                prompt_version=prompt_version)
             
             # Markdownを HTML に変換
-            minutes_html = render_template_string("{{ minutes|markdown }}", minutes=minutes)
+            minutes_html = render_minutes_html(minutes)
             
             # 利用回数をインクリメント
             usage_count += 1
             app_logger.info(f"Usage count incremented. Current count: {usage_count}")
             
-            return jsonify({'minutes_html': minutes_html}), 200
+            return jsonify({
+                'minutes_html': minutes_html,
+                'prompt_version': prompt_version,
+                'mode': regenerated,
+                'sections': sections
+            }), 200
+        except StorageError as e:
+            app_logger.warning(f"Saved minutes unavailable for {transcript_id}: {str(e)}")
+            return jsonify({'error': str(e)}), 410
         except Exception as e:
             app_logger.error(f"Error in regenerating minutes: {str(e)}", exc_info=True)
             return jsonify({'error': '議事録の再生成中にエラーが発生しました'}), 500
 
+    @app.route('/batch', methods=['POST'])
+    @limiter.limit("1500 per day")
+    def upload_batch():
+        global usage_count
+        if is_draining():
+            return _draining_response()
+        files = [f for f in request.files.getlist('files') if f and f.filename]
+        app_logger.info(f"Request to upload batch. Files: {len(files)}")
+        if not files:
+            return jsonify({'error': 'ファイルが選択されていません'}), 400
+
+        allowed_extensions = current_app.config['ALLOWED_EXTENSIONS']
+        rejected = [f.filename for f in files if not allowed_file(f.filename, allowed_extensions)]
+        if rejected:
+            app_logger.warning(f"Batch contains files with disallowed extensions: {rejected}")
+            return jsonify({'error': '許可されていないファイル形式です', 'rejected': rejected}), 400
+
+        # セッション固有のアップロードディレクトリを作成
+        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], session['session_id'])
+        os.makedirs(upload_dir, exist_ok=True)
+
+        saved = [(f.filename, save_upload(f, upload_dir)) for f in files]
+        batch = submit_batch(saved, upload_dir, _notifier(request.form.get('sid')), owner=request.form.get('sid'),
+                             session_id=session['session_id'])
+
+        # 利用回数をファイル数分インクリメント
+        usage_count += len(saved)
+        app_logger.info(f"Usage count incremented. Current count: {usage_count}")
+
+        return jsonify(batch), 202
+
+    @app.route('/batch/<batch_id>')
+    def batch_status(batch_id):
+        app_logger.info(f"Request for batch status: {batch_id}")
+        batch = get_batch_status(batch_id)
+        if batch is None or get_batch_session(batch_id) != session.get('session_id'):
+            return jsonify({'error': 'バッチが見つかりません'}), 404
+        return jsonify(batch)
+
+    def _load_owned_transcript(transcript_id):
+        """文字起こしを読み込む。現在のブラウザのセッションが作成したものでない場合は None"""
+        session_id = session.get('session_id')
+        record = load_transcript(transcript_id)
+        if record is None or not session_id or record['metadata'].get('session_id') != session_id:
+            return None
+        return record
+
+    @app.route('/transcripts/<transcript_id>')
+    def get_transcript(transcript_id):
+        app_logger.info(f"Request for transcript: {transcript_id}")
+        record = _load_owned_transcript(transcript_id)
+        if record is None:
+            return jsonify({'error': '文字起こしが見つかりません'}), 404
+        return jsonify({
+            'transcript_id': transcript_id,
+            'updated_at': record['updated_at'],
+            'segments': [_segment_json(s) for s in record['segments']],
+            'failed_segments': failed_segment_indexes(record['segments'])
+        })
+
+    @app.route('/transcripts/<transcript_id>/segments')
+    def get_transcript_segments(transcript_id):
+        """
+        文字起こしのセグメントをページ単位で返すエンドポイント
+
+        クエリパラメータ: offset（先頭のセグメント番号）, limit（件数、最大 SEGMENT_PAGE_MAX_LIMIT）
+        """
+        record = _load_owned_transcript(transcript_id)
+        if record is None:
+            return jsonify({'error': '文字起こしが見つかりません'}), 404
+        try:
+            offset = max(0, int(request.args.get('offset', 0)))
+            limit = max(1, min(int(request.args.get('limit', SEGMENT_PAGE_DEFAULT_LIMIT)), SEGMENT_PAGE_MAX_LIMIT))
+        except ValueError:
+            return jsonify({'error': 'offset と limit には整数を指定してください'}), 400
+
+        segments = record['segments']
+        next_offset = offset + limit if offset + limit < len(segments) else None
+        return jsonify({
+            'transcript_id': transcript_id,
+            'updated_at': record['updated_at'],
+            'total': len(segments),
+            'offset': offset,
+            'next_offset': next_offset,
+            'segments': [_segment_json(s) for s in segments[offset:offset + limit]],
+            'failed_segments': failed_segment_indexes(segments)
+        })
+
+    @app.route('/transcripts/<transcript_id>/stream')
+    def stream_transcript(transcript_id):
+        """
+        文字起こしを NDJSON（1行に1つのJSON）で順次返すエンドポイント
+
+        1行目は概要（type: meta）、以降は1行に1セグメント（type: segment）。
+        ブラウザは受信したセグメントから順に表示できる。
+        """
+        app_logger.info(f"Request to stream transcript: {transcript_id}")
+        record = _load_owned_transcript(transcript_id)
+        if record is None:
+            return jsonify({'error': '文字起こしが見つかりません'}), 404
+
+        def generate():
+            yield json.dumps({
+                'type': 'meta',
+                'transcript_id': transcript_id,
+                'updated_at': record['updated_at'],
+                'total': len(record['segments']),
+                'failed_segments': failed_segment_indexes(record['segments'])
+            }, ensure_ascii=False) + '\n'
+            for segment in record['segments']:
+                yield json.dumps(dict(_segment_json(segment), type='segment'), ensure_ascii=False) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                        headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-store'})
+
+    @app.route('/transcripts/<transcript_id>/retranscribe', methods=['POST'])
+    @limiter.limit("1500 per day")
+    def retranscribe_transcript(transcript_id):
+        """
+        文字起こしの一部を再認識するエンドポイント
+
+        JSONで {"start": 秒, "end": 秒} を指定するとその範囲と重なるセグメントを、
+        {"failed_only": true} を指定すると認識に失敗したセグメントだけを再認識する。
+        """
+        app_logger.info(f"Request to re-transcribe transcript: {transcript_id}")
+        record = _load_owned_transcript(transcript_id)
+        if record is None:
+            return jsonify({'error': '文字起こしが見つかりません'}), 404
+
+        data = request.get_json(silent=True) or {}
+        if data.get('failed_only'):
+            indexes = failed_segment_indexes(record['segments'])
+        else:
+            try:
+                start_ms = int(float(data['start']) * 1000)
+                end_ms = int(float(data['end']) * 1000)
+            except (KeyError, TypeError, ValueError):
+                return jsonify({'error': 'start と end（秒）、または failed_only を指定してください'}), 400
+            if end_ms <= start_ms:
+                return jsonify({'error': 'end は start より後を指定してください'}), 400
+            indexes = segment_indexes_for_range(record['segments'], start_ms, end_ms)
+
+        if not indexes:
+            return jsonify({'transcript_id': transcript_id, 'segments': [],
+                            'failed_segments': failed_segment_indexes(record['segments'])})
+
+        notify = _notifier(data.get('sid'))
+
+        def progress_callback(progress):
+            notify('transcription_progress', {'progress': progress, 'transcript_id': transcript_id})
+
+        try:
+            record, updated = retranscribe(transcript_id, indexes, progress_callback, new_job_deadline())
+        except StorageError:
+            app_logger.warning(f"Audio for transcript {transcript_id} is no longer available")
+            return jsonify({'error': '音声ファイルが削除されているため再認識できません'}), 410
+        except JobCancelledError as e:
+            return jsonify({'error': str(e)}), 504
+
+        archive_meeting(transcript_id, transcription=transcript_text(record))
+        return jsonify({
+            'transcript_id': transcript_id,
+            'segments': [_segment_json(s) for s in updated],
+            'failed_segments': failed_segment_indexes(record['segments'])
+        })
+
+    @app.route('/search')
+    def search_archive():
+        """
+        アーカイブされた文字起こしと議事録を全文検索するエンドポイント
+
+        クエリパラメータ: q（検索語）, from / to（YYYY-MM-DD）, provider（gemini, openai, claude）, limit, offset
+
+        検索の対象は現在のブラウザのセッションが作成したものに限る（管理者トークンを指定した場合はすべて）。
+        """
+        query = request.args.get('q', '').strip()
+        app_logger.info(f"Request to search archive: {query!r}")
+        if not query:
+            return jsonify({'error': '検索語を指定してください'}), 400
+
+        provider = request.args.get('provider')
+        if provider and provider not in PROVIDERS:
+            return jsonify({'error': '不明なプロバイダです'}), 400
+        admin = _is_admin()
+        session_id = None if admin else session.get('session_id')
+        if not admin and not session_id:
+            return jsonify({'query': query, 'total': 0, 'results': []})
+        try:
+            result = search(
+                query,
+                session_id,
+                date_from=request.args.get('from'),
+                date_to=request.args.get('to'),
+                api_name=PROVIDERS[provider][1] if provider else None,
+                limit=request.args.get('limit', 20, type=int),
+                offset=request.args.get('offset', 0, type=int)
+            )
+        except ValueError:
+            return jsonify({'error': '日付は YYYY-MM-DD の形式で指定してください'}), 400
+        return jsonify(dict(result, query=query))
+
+    def _segment_json(segment):
+        return {
+            'index': segment['index'],
+            'start': segment['start'] / 1000,
+            'end': segment['end'] / 1000,
+            'text': segment['text'],
+            'status': segment['status']
+        }
+
     @app.route('/download/<file_type>')
     def download_file(file_type):
         app_logger.info(f"Request to download file. Type: {file_type}")
@@ -136,15 +435,20 @@ def register_routes(app, socketio):
             app_logger.warning("No minutes found in session for download")
             return "議事録が見つかりません", 404
 
-        # ファイルの準備
-        file_info = prepare_download_file(minutes, file_type)
-        if file_info is None:
+        fmt = normalize_format(file_type)
+        if fmt is None:
             app_logger.warning(f"Invalid file type for download: {file_type}")
             return "無効なファイルタイプです", 400
 
-        filename, content, mimetype = file_info
-        app_logger.info(f"File prepared for download: {filename}")
-        return create_download_file(filename, content, mimetype)
+        # ファイルの準備（同じ内容・フォーマットの変換結果はキャッシュから返す）
+        try:
+            entry = render_export(minutes, fmt)
+        except ExportUnavailableError as e:
+            app_logger.error(f"Export format unavailable: {fmt}: {str(e)}")
+            return "このファイル形式は現在利用できません", 501
+
+        app_logger.info(f"File prepared for download: {entry['filename']}")
+        return send_export(entry)
 
     @app.route('/api/usage-status')
     def get_usage_status():
@@ -163,9 +467,123 @@ def register_routes(app, socketio):
             'isLimited': usage_count >= 1500
         })
 
+    @app.route('/jobs/<job_id>')
+    def job_status(job_id):
+        """
+        ジョブの状態を返すエンドポイント
+
+        サーバーの再起動で中断されたジョブは別のバッチとして再開されるため、
+        その場合は再開先の batch_id と file_id を返す（/batch/<batch_id> で結果を取得できる）。
+        """
+        session_id = session.get('session_id')
+        if is_job_owner(job_id, request.args.get('sid'), session_id):
+            return jsonify(dict(get_job(job_id) or {'job_id': job_id}, status='running'))
+        resumed = get_resumed(job_id)
+        if resumed and session_id and resumed.get('session_id') == session_id:
+            return jsonify({'job_id': job_id, 'status': 'resumed',
+                            'batch_id': resumed['batch_id'], 'file_id': resumed['file_id']})
+        return jsonify({'error': 'ジョブが見つかりません'}), 404
+
+    @app.route('/jobs/<job_id>/cancel', methods=['POST'])
+    def cancel_job_route(job_id):
+        app_logger.info(f"Request to cancel job: {job_id}")
+        data = request.get_json(silent=True) or {}
+        sid = data.get('sid') or request.form.get('sid')
+        # 他のクライアントのジョブは存在しないものとして扱う
+        if not is_job_owner(job_id, sid, session.get('session_id')) or not cancel_job(job_id, 'cancelled by user'):
+            return jsonify({'error': 'ジョブが見つかりません'}), 404
+        return jsonify({'job_id': job_id, 'cancelled': True})
+
+    @socketio.on('cancel_jobs')
+    def handle_cancel_jobs():
+        cancelled = cancel_jobs_for_owner(request.sid, 'cancelled by user')
+        app_logger.info(f"Client {request.sid} cancelled {cancelled} jobs")
+
+    @socketio.on('live_start')
+    def handle_live_start():
+        if is_draining():
+            emit('live_error', {'error': 'サーバーを再起動しています。しばらくしてからもう一度お試しください。'})
+            return
+        sid = request.sid
+        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], '_live')
+        # 録音中の文字起こしは録音しているクライアントにだけ送る
+        notify = _notifier(sid)
+        live_id = start_live(sid, upload_dir, notify, session.get('session_id'))
+        emit('live_started', {'live_id': live_id})
+
+    @socketio.on('live_chunk')
+    def handle_live_chunk(data):
+        try:
+            add_chunk(data.get('live_id'), request.sid, data.get('audio'))
+        except LiveSessionError as e:
+            emit('live_error', {'live_id': data.get('live_id'), 'error': str(e)})
+
+    @socketio.on('live_stop')
+    def handle_live_stop(data):
+        try:
+            stop_live(data.get('live_id'), request.sid)
+        except LiveSessionError as e:
+            emit('live_error', {'live_id': data.get('live_id'), 'error': str(e)})
+
+    @app.route('/api/drain-status')
+    def drain_status():
+        # 実行中のジョブの一覧は他の利用者のものも含むため、管理者にだけ返す
+        return jsonify(get_drain_status(include_jobs=_is_admin()))
+
+    def _notifier(sid):
+        """処理を要求したクライアントにだけ進捗を通知するコールバックを返す（sid がない場合は通知しない）"""
+        if not sid:
+            return lambda event, data: None
+        return lambda event, data: socketio.emit(event, data, to=sid)
+
+    def _draining_response():
+        app_logger.info("Rejecting new upload while draining")
+        response = jsonify({'error': 'サーバーを再起動しています。しばらくしてからもう一度お試しください。'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+
+    def _is_admin():
+        token = request.headers.get('X-Admin-Token', '')
+        return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+    @app.route('/admin/profiling', methods=['GET', 'POST'])
+    def admin_profiling():
+        if not _is_admin():
+            return jsonify({'error': '権限がありません'}), 403
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            return jsonify(update_settings(data.get('profile_all'), data.get('loop_monitor')))
+        return jsonify(dict(get_settings(), profiles=list_profiles()))
+
+    @app.route('/admin/profiles/<profile_id>/<stage>')
+    def admin_profile_stage(profile_id, stage):
+        if not _is_admin():
+            return jsonify({'error': '権限がありません'}), 403
+        path = profile_stage_path(profile_id, stage)
+        if path is None:
+            return jsonify({'error': '計測結果が見つかりません'}), 404
+        return send_file(os.path.abspath(path), mimetype='text/plain')
+
+    @app.route('/admin/greenlets')
+    def admin_greenlets():
+        if not _is_admin():
+            return jsonify({'error': '権限がありません'}), 403
+        return jsonify(dump_greenlets())
+
+    @app.route('/api/import-report')
+    def import_report():
+        if not _is_admin():
+            return jsonify({'error': '権限がありません'}), 403
+        app_logger.info("Request for import report")
+        return jsonify(get_import_report())
+
     @socketio.on('connect')
     def handle_connect():
         app_logger.info("Client connected")
+        # 再起動後に再開したジョブの通知を受け取れるよう、ブラウザのセッションごとのルームに参加する
+        if session.get('session_id'):
+            join_room(session['session_id'])
 
     @app.teardown_appcontext
     def cleanup_session_files(error):
@@ -181,6 +599,12 @@ def register_routes(app, socketio):
     @socketio.on('disconnect')
     def handle_disconnect():
         app_logger.info("Client disconnected")
+        # 録音中だった場合は受信済みの音声までの文字起こしを保存する
+        stop_live_for_owner(request.sid)
+        # 切断したクライアントの処理は結果を受け取れないためキャンセルする
+        cancelled = cancel_jobs_for_owner(request.sid)
+        if cancelled:
+            app_logger.info(f"Cancelled {cancelled} jobs owned by disconnected client {request.sid}")
         cleanup_session_files(None)
 
     app_logger.info("All routes registered successfully")
\ No newline at end of file
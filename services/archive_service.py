@@ -0,0 +1,262 @@
+# services/archive_service.py
+
+import os
+import re
+import html
+import time
+import sqlite3
+import datetime
+import threading
+from logger import app_logger
+
+# 文字起こしと議事録を保存するSQLiteデータベースのパス
+ARCHIVE_DB_PATH = os.environ.get('ARCHIVE_DB_PATH', os.path.join('uploads', 'archive.sqlite3'))
+
+# 検索結果の最大件数
+SEARCH_MAX_LIMIT = 100
+
+# スニペットに含めるトークン数（trigram のため、おおよその文字数）
+SNIPPET_TOKENS = 24
+
+# trigram トークナイザーで索引を使用できる最小の文字数
+TRIGRAM_MIN_CHARS = 3
+
+# スニペット内の一致箇所を示す制御文字（HTMLエスケープ後に <mark> に置き換える）
+_MARK_OPEN, _MARK_CLOSE = '\x02', '\x03'
+
+# 保存する列（transcript_id 以外）
+ARCHIVE_FIELDS = ('title', 'filename', 'api_name', 'prompt_version', 'transcription', 'minutes', 'session_id')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meetings (
+    id INTEGER PRIMARY KEY,
+    transcript_id TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    filename TEXT NOT NULL DEFAULT '',
+    api_name TEXT NOT NULL DEFAULT '',
+    prompt_version TEXT NOT NULL DEFAULT '',
+    transcription TEXT NOT NULL DEFAULT '',
+    minutes TEXT NOT NULL DEFAULT '',
+    session_id TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS meetings_created_at ON meetings (created_at);
+CREATE INDEX IF NOT EXISTS meetings_api_name ON meetings (api_name);
+
+-- meetings_session_id の索引は、session_id 列のない既存のデータベースを移行した後に作成する（_migrate）
+
+-- 日本語は単語の区切りがないため、3文字単位の trigram で索引を作成する
+CREATE VIRTUAL TABLE IF NOT EXISTS meetings_fts USING fts5 (
+    title, transcription, minutes,
+    content='meetings', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS meetings_ai AFTER INSERT ON meetings BEGIN
+    INSERT INTO meetings_fts (rowid, title, transcription, minutes)
+    VALUES (new.id, new.title, new.transcription, new.minutes);
+END;
+CREATE TRIGGER IF NOT EXISTS meetings_ad AFTER DELETE ON meetings BEGIN
+    INSERT INTO meetings_fts (meetings_fts, rowid, title, transcription, minutes)
+    VALUES ('delete', old.id, old.title, old.transcription, old.minutes);
+END;
+CREATE TRIGGER IF NOT EXISTS meetings_au AFTER UPDATE ON meetings BEGIN
+    INSERT INTO meetings_fts (meetings_fts, rowid, title, transcription, minutes)
+    VALUES ('delete', old.id, old.title, old.transcription, old.minutes);
+    INSERT INTO meetings_fts (rowid, title, transcription, minutes)
+    VALUES (new.id, new.title, new.transcription, new.minutes);
+END;
+"""
+
+# スレッドごとの接続（sqlite3 の接続はスレッド間で共有しない）
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+def _migrate(conn):
+    """以前のバージョンで作成したデータベースに、後から追加した列と索引を追加する"""
+    columns = {row['name'] for row in conn.execute('PRAGMA table_info(meetings)')}
+    if 'session_id' not in columns:
+        app_logger.info("Adding session_id column to archive database")
+        conn.execute("ALTER TABLE meetings ADD COLUMN session_id TEXT NOT NULL DEFAULT ''")
+    conn.execute('CREATE INDEX IF NOT EXISTS meetings_session_id ON meetings (session_id)')
+    conn.commit()
+
+def _connect():
+    global _initialized
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        return conn
+
+    os.makedirs(os.path.dirname(os.path.abspath(ARCHIVE_DB_PATH)), exist_ok=True)
+    conn = sqlite3.connect(ARCHIVE_DB_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+    # 検索中も書き込みをブロックしないよう WAL モードを使用する
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    with _init_lock:
+        if not _initialized:
+            conn.executescript(_SCHEMA)
+            _migrate(conn)
+            _initialized = True
+    _local.conn = conn
+    return conn
+
+def _extract_title(minutes):
+    title_match = re.search(r'^#\s*(.+)$', minutes or '', re.MULTILINE)
+    return title_match.group(1).strip() if title_match else ''
+
+def archive_meeting(transcript_id, **fields):
+    """
+    文字起こしと議事録をアーカイブに保存（または更新）し、検索索引を更新する関数
+
+    指定した列だけを更新するため、文字起こしの修正や議事録の再生成のたびに呼び出せる。
+    アーカイブへの保存に失敗しても呼び出し側の処理は継続できるよう、例外は記録するだけで送出しない。
+
+    Args:
+        transcript_id (str): 文字起こしのID
+        **fields: 保存する列（filename, api_name, prompt_version, transcription, minutes, session_id）。
+            minutes を指定した場合は見出しから title を設定する。
+            session_id は検索結果を作成したブラウザのセッションに限定するため、最初の保存時に指定する
+
+    Returns:
+        bool: 保存できた場合は True
+    """
+    if 'minutes' in fields and 'title' not in fields:
+        fields['title'] = _extract_title(fields['minutes'])
+    fields = {key: value or '' for key, value in fields.items() if key in ARCHIVE_FIELDS}
+
+    columns = ['transcript_id', 'created_at', 'updated_at'] + list(fields)
+    now = time.time()
+    values = [transcript_id, now, now] + list(fields.values())
+    updates = ', '.join(['updated_at = excluded.updated_at'] + [f"{key} = excluded.{key}" for key in fields])
+    sql = (
+        f"INSERT INTO meetings ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT (transcript_id) DO UPDATE SET {updates}"
+    )
+    try:
+        conn = _connect()
+        with conn:
+            conn.execute(sql, values)
+        app_logger.info(f"Archived meeting {transcript_id} ({', '.join(fields)})")
+        return True
+    except sqlite3.Error as e:
+        app_logger.error(f"Failed to archive meeting {transcript_id}: {str(e)}", exc_info=True)
+        return False
+
+def _fts_query(query):
+    """検索語を空白で分割し、それぞれをフレーズとして AND で結合した FTS5 のクエリを作成する"""
+    terms = query.split()
+    return ' AND '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+def _parse_date(value, end_of_day=False):
+    if not value:
+        return None
+    date = datetime.datetime.strptime(value, '%Y-%m-%d')
+    if end_of_day:
+        date += datetime.timedelta(days=1)
+    return date.timestamp()
+
+def search(query, session_id, date_from=None, date_to=None, api_name=None, limit=20, offset=0):
+    """
+    アーカイブされた文字起こしと議事録を全文検索する関数
+
+    3文字以上の検索語は trigram の索引で検索し、関連度順に並べる。
+    2文字以下の検索語は索引を使用できないため、部分一致で検索して新しい順に並べる。
+
+    Args:
+        query (str): 検索語（空白区切りで AND 検索）
+        session_id (str): このブラウザのセッションが作成したものだけを検索する。None の場合はすべてを検索する（管理者用）
+        date_from (str): 検索対象の開始日（YYYY-MM-DD）
+        date_to (str): 検索対象の終了日（YYYY-MM-DD、その日を含む）
+        api_name (str): 議事録の生成に使用したAPI名で絞り込む
+        limit (int): 返す件数
+        offset (int): 読み飛ばす件数
+
+    Returns:
+        dict: total（該当件数）と results（transcript_id, title, created_at, api_name, スニペットなど）
+
+    Raises:
+        ValueError: 日付の形式が正しくない場合
+    """
+    terms = query.split()
+    if not terms:
+        return {'total': 0, 'results': []}
+    limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+    offset = max(0, int(offset))
+
+    filters, params = [], []
+    if session_id is not None:
+        filters.append('m.session_id = ?')
+        params.append(session_id)
+    start, end = _parse_date(date_from), _parse_date(date_to, end_of_day=True)
+    if start is not None:
+        filters.append('m.created_at >= ?')
+        params.append(start)
+    if end is not None:
+        filters.append('m.created_at < ?')
+        params.append(end)
+    if api_name:
+        filters.append('m.api_name = ?')
+        params.append(api_name)
+
+    conn = _connect()
+    use_index = all(len(term) >= TRIGRAM_MIN_CHARS for term in terms)
+    if use_index:
+        where = ' AND '.join(['meetings_fts MATCH ?'] + filters)
+        match_params = [_fts_query(query)] + params
+        base = f"FROM meetings_fts JOIN meetings m ON m.id = meetings_fts.rowid WHERE {where}"
+        snippets = (
+            f"snippet(meetings_fts, 1, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', {SNIPPET_TOKENS}) AS transcription_snippet, "
+            f"snippet(meetings_fts, 2, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', {SNIPPET_TOKENS}) AS minutes_snippet"
+        )
+        order = 'bm25(meetings_fts, 10.0, 1.0, 3.0)'
+    else:
+        like_filters = []
+        for term in terms:
+            like_filters.append("(m.title LIKE ? ESCAPE '\\' OR m.transcription LIKE ? ESCAPE '\\' OR m.minutes LIKE ? ESCAPE '\\')")
+            pattern = '%' + re.sub(r'([%_\\])', r'\\\1', term) + '%'
+            params = params + [pattern] * 3
+        where = ' AND '.join(filters + like_filters)
+        match_params = params
+        base = f"FROM meetings m WHERE {where}"
+        snippets = "m.transcription AS transcription_snippet, m.minutes AS minutes_snippet"
+        order = 'm.created_at DESC'
+
+    start_time = time.perf_counter()
+    total = conn.execute(f"SELECT COUNT(*) {base}", match_params).fetchone()[0]
+    rows = conn.execute(
+        f"SELECT m.transcript_id, m.title, m.filename, m.created_at, m.api_name, m.prompt_version, {snippets} "
+        f"{base} ORDER BY {order} LIMIT ? OFFSET ?",
+        match_params + [limit, offset]
+    ).fetchall()
+    app_logger.info(f"Archive search for {query!r} returned {len(rows)}/{total} results "
+                    f"in {(time.perf_counter() - start_time) * 1000:.1f}ms")
+
+    results = []
+    for row in rows:
+        result = dict(row)
+        for key in ('transcription_snippet', 'minutes_snippet'):
+            snippet = result[key] if use_index else _like_snippet(result[key], terms[0])
+            result[key] = _render_snippet(snippet)
+        results.append(result)
+    return {'total': total, 'results': results}
+
+def _like_snippet(text, term):
+    """部分一致検索の結果から、検索語の前後を切り出したスニペットを作成する"""
+    position = text.find(term)
+    if position < 0:
+        return ''
+    start = max(0, position - SNIPPET_TOKENS)
+    end = min(len(text), position + len(term) + SNIPPET_TOKENS)
+    snippet = text[start:position] + _MARK_OPEN + term + _MARK_CLOSE + text[position + len(term):end]
+    return ('…' if start > 0 else '') + snippet + ('…' if end < len(text) else '')
+
+def _render_snippet(snippet):
+    """スニペットをHTMLエスケープし、一致箇所を <mark> で囲む"""
+    return html.escape(snippet).replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+
+def get_meeting(transcript_id):
+    """アーカイブされた文字起こしと議事録を返す。見つからない場合は None"""
+    row = _connect().execute('SELECT * FROM meetings WHERE transcript_id = ?', (transcript_id,)).fetchone()
+    return dict(row) if row else None
@@ -2,11 +2,92 @@
 
 import os
 import subprocess
+import wave
+import concurrent.futures
 import psutil
 from pydub import AudioSegment
 from logger import app_logger
+from services.deadline_service import timeout_for
 
-def convert_to_wav(input_file, output_dir):
+# 並列変換を行う最小の音声長（秒）。これより短いファイルは単一プロセスで変換する
+PARALLEL_MIN_DURATION = int(os.environ.get('PARALLEL_CONVERSION_MIN_DURATION', 600))
+
+# 並列変換で起動するffmpegワーカーの最大数
+MAX_CONVERSION_WORKERS = int(os.environ.get('MAX_CONVERSION_WORKERS', os.cpu_count() or 1))
+
+# 各ワーカーに割り当てる最小の区間長（秒）
+MIN_CHUNK_DURATION = 120
+
+# ffmpegの実行中にキャンセルと期限を確認する間隔（秒）
+FFMPEG_POLL_INTERVAL = 1.0
+
+# ffprobeの最大実行時間（秒）
+FFPROBE_TIMEOUT = 30
+
+# 変換後のWAVのフォーマット
+OUTPUT_SAMPLE_RATE = 44100
+OUTPUT_CHANNELS = 2
+OUTPUT_SAMPLE_WIDTH = 2  # pcm_s16le
+
+def run_ffmpeg(command, deadline=None):
+    """
+    ffmpegコマンドを実行する関数
+
+    deadline が指定されている場合は一定間隔でキャンセルと期限を確認し、
+    打ち切られた場合はプロセスを終了して JobCancelledError / DeadlineExceededError を送出する。
+
+    Returns:
+        subprocess.CompletedProcess: 実行結果
+    """
+    app_logger.debug(f"Executing ffmpeg command: {' '.join(command)}")
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=None if deadline is None else FFMPEG_POLL_INTERVAL)
+            return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+        except subprocess.TimeoutExpired:
+            if deadline.done():
+                process.kill()
+                process.communicate()
+                app_logger.warning(f"ffmpeg process killed: {deadline.reason or 'deadline exceeded'}")
+                deadline.check()
+
+def probe_duration(input_file, deadline=None):
+    """
+    ffprobeを使用して入力ファイルの長さ（秒）を取得する関数
+
+    Args:
+        input_file (str): 入力ファイルのパス
+
+    Returns:
+        float: 音声の長さ（秒）。取得できない場合は None
+    """
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        input_file
+    ]
+    app_logger.debug(f"Executing ffprobe command: {' '.join(command)}")
+    try:
+        result = subprocess.run(command, capture_output=True, text=True,
+                                timeout=timeout_for(deadline, FFPROBE_TIMEOUT))
+    except (OSError, subprocess.TimeoutExpired) as e:
+        app_logger.warning(f"ffprobe could not be executed: {str(e)}")
+        return None
+
+    if result.returncode != 0:
+        app_logger.warning(f"ffprobe error: {result.stderr}")
+        return None
+
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        app_logger.warning(f"Unexpected ffprobe output: {result.stdout!r}")
+        return None
+
+def convert_to_wav(input_file, output_dir, parallel=True, deadline=None, duration=None):
     app_logger.info(f"Converting audio file to WAV: {input_file}")
     name, ext = os.path.splitext(os.path.basename(input_file))
     output_file = os.path.join(output_dir, f"{name}.wav")
@@ -16,25 +97,15 @@ def convert_to_wav(input_file, output_dir):
         if not os.path.exists(input_file):
             raise FileNotFoundError(f"Input file not found: {input_file}")
 
-        # ffmpegコマンドの構築
-        command = [
-            'ffmpeg',
-            '-i', input_file,
-            '-acodec', 'pcm_s16le',
-            '-ac', '2',
-            '-ar', '44100',
-            '-y',
-            '-bufsize', '10M',  # バッファサイズを10MBに設定
-            output_file
-        ]
-        
-        # ffmpegの実行
-        app_logger.debug(f"Executing ffmpeg command: {' '.join(command)}")
-        result = subprocess.run(command, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            app_logger.error(f"ffmpeg error: {result.stderr}")
-            raise Exception(f"ffmpeg command failed: {result.stderr}")
+        # 事前確認で長さを取得済みの場合は ffprobe を再実行しない
+        if parallel and duration is None:
+            duration = probe_duration(input_file, deadline)
+        workers = _plan_workers(duration) if parallel else 1
+        if workers > 1:
+            app_logger.info(f"Using parallel conversion: duration={duration:.2f}s, workers={workers}")
+            _convert_parallel(input_file, output_file, output_dir, duration, workers, deadline)
+        else:
+            _convert_single(input_file, output_file, deadline)
         
         # 出力ファイルの存在確認
         if not os.path.exists(output_file):
@@ -66,6 +137,119 @@ def convert_to_wav(input_file, output_dir):
         app_logger.error(f"Error in convert_to_wav: {str(e)}", exc_info=True)
         raise
 
+def _plan_workers(duration):
+    """音声の長さから並列変換のワーカー数を決定する"""
+    if not duration or duration < PARALLEL_MIN_DURATION:
+        return 1
+    return max(1, min(MAX_CONVERSION_WORKERS, int(duration // MIN_CHUNK_DURATION)))
+
+def _convert_single(input_file, output_file, deadline=None):
+    """1つのffmpegプロセスでファイル全体を変換する"""
+    # ffmpegコマンドの構築
+    command = [
+        'ffmpeg',
+        '-i', input_file,
+        '-acodec', 'pcm_s16le',
+        '-ac', str(OUTPUT_CHANNELS),
+        '-ar', str(OUTPUT_SAMPLE_RATE),
+        '-y',
+        '-bufsize', '10M',  # バッファサイズを10MBに設定
+        output_file
+    ]
+    
+    # ffmpegの実行
+    result = run_ffmpeg(command, deadline)
+    
+    if result.returncode != 0:
+        app_logger.error(f"ffmpeg error: {result.stderr}")
+        raise Exception(f"ffmpeg command failed: {result.stderr}")
+
+def _convert_chunk(input_file, chunk_file, start_sample, num_samples, deadline=None):
+    """
+    指定されたサンプル範囲を生のPCMとして変換する
+
+    区間の境界はサンプル単位で計算し、ffmpegの出力を期待サンプル数に切り詰め・補完することで
+    チャンク同士をずれなく連結できるようにする。num_samples が None の場合は末尾まで変換する。
+    """
+    start = start_sample / OUTPUT_SAMPLE_RATE
+    command = [
+        'ffmpeg',
+        '-ss', f"{start:.6f}",
+        '-i', input_file,
+    ]
+    if num_samples is not None:
+        # 端数の取りこぼしを防ぐため少し長めに読み、後で正確な長さに揃える
+        command += ['-t', f"{num_samples / OUTPUT_SAMPLE_RATE + 0.5:.6f}"]
+    command += [
+        '-vn',
+        '-f', 's16le',
+        '-acodec', 'pcm_s16le',
+        '-ac', str(OUTPUT_CHANNELS),
+        '-ar', str(OUTPUT_SAMPLE_RATE),
+        '-y',
+        chunk_file
+    ]
+
+    result = run_ffmpeg(command, deadline)
+    if result.returncode != 0:
+        app_logger.error(f"ffmpeg error: {result.stderr}")
+        raise Exception(f"ffmpeg command failed: {result.stderr}")
+
+    if num_samples is not None:
+        frame_size = OUTPUT_CHANNELS * OUTPUT_SAMPLE_WIDTH
+        expected_size = num_samples * frame_size
+        actual_size = os.path.getsize(chunk_file)
+        if actual_size > expected_size:
+            with open(chunk_file, 'r+b') as f:
+                f.truncate(expected_size)
+        elif actual_size < expected_size:
+            # デコーダの端数で不足した分は無音で補完する
+            with open(chunk_file, 'ab') as f:
+                f.write(b'\x00' * (expected_size - actual_size))
+            app_logger.debug(f"Padded chunk {chunk_file} with {expected_size - actual_size} bytes of silence")
+    return chunk_file
+
+def _convert_parallel(input_file, output_file, output_dir, duration, workers, deadline=None):
+    """ファイルを時間範囲ごとに分割し、複数のffmpegプロセスで並列に変換して連結する"""
+    total_samples = int(duration * OUTPUT_SAMPLE_RATE)
+    chunk_samples = -(-total_samples // workers)
+    name = os.path.splitext(os.path.basename(output_file))[0]
+
+    chunks = []
+    for i in range(workers):
+        start_sample = i * chunk_samples
+        if start_sample >= total_samples:
+            break
+        # 最後のチャンクはffprobeの長さの誤差を吸収するため末尾まで変換する
+        num_samples = None if i == workers - 1 else chunk_samples
+        chunk_file = os.path.join(output_dir, f"{name}.part{i}.pcm")
+        chunks.append((chunk_file, start_sample, num_samples))
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            futures = [executor.submit(_convert_chunk, input_file, chunk_file, start_sample, num_samples, deadline)
+                       for chunk_file, start_sample, num_samples in chunks]
+            for future in futures:
+                future.result()
+
+        # PCMチャンクを順番に連結してWAVを書き出す
+        with wave.open(output_file, 'wb') as wav:
+            wav.setnchannels(OUTPUT_CHANNELS)
+            wav.setsampwidth(OUTPUT_SAMPLE_WIDTH)
+            wav.setframerate(OUTPUT_SAMPLE_RATE)
+            for chunk_file, _, _ in chunks:
+                with open(chunk_file, 'rb') as f:
+                    while True:
+                        data = f.read(1024 * 1024)
+                        if not data:
+                            break
+                        wav.writeframesraw(data)
+        app_logger.info(f"Joined {len(chunks)} converted chunks into {output_file}")
+    finally:
+        for chunk_file, _, _ in chunks:
+            if os.path.exists(chunk_file):
+                os.remove(chunk_file)
+
 def split_audio(audio_file, output_dir, segment_length=60):
     app_logger.info(f"Splitting audio file: {audio_file}")
     segments = []
@@ -0,0 +1,390 @@
+# services/batch_service.py
+
+import os
+import uuid
+import time
+import heapq
+import itertools
+import threading
+import concurrent.futures
+from services.audio_service import convert_to_wav
+from services.transcription_service import transcribe_segments, join_segments
+from services.transcript_store import save_transcript, save_minutes
+from services.pipeline_service import generate_minutes_with_fallback, render_minutes_html
+from services.archive_service import archive_meeting
+from services.storage_service import get_storage
+from services.preflight_service import preflight_many
+from services.eta_service import estimate_processing_time, record_timings
+from services.lifecycle_service import start_job, update_job, finish_job, record_resumed
+from services.deadline_service import JobCancelledError, new_job_deadline
+from logger import app_logger
+
+# 各ステージで同時に処理するファイル数（全バッチで共有）
+CONVERSION_WORKERS = int(os.environ.get('BATCH_CONVERSION_WORKERS', max(1, (os.cpu_count() or 1) // 2)))
+TRANSCRIPTION_WORKERS = int(os.environ.get('BATCH_TRANSCRIPTION_WORKERS', 2))
+GENERATION_WORKERS = int(os.environ.get('BATCH_GENERATION_WORKERS', 2))
+
+# 完了したバッチの情報を保持する時間（秒）
+BATCH_RETENTION_SECONDS = 24 * 60 * 60
+
+# ステージごとの共有ワーカープール
+_conversion_pool = concurrent.futures.ThreadPoolExecutor(max_workers=CONVERSION_WORKERS, thread_name_prefix='batch-convert')
+_transcription_pool = concurrent.futures.ThreadPoolExecutor(max_workers=TRANSCRIPTION_WORKERS, thread_name_prefix='batch-transcribe')
+_generation_pool = concurrent.futures.ThreadPoolExecutor(max_workers=GENERATION_WORKERS, thread_name_prefix='batch-generate')
+
+_batches = {}
+_lock = threading.Lock()
+
+# 変換待ちのファイル（推定処理時間, 投入順, batch_id, file_id, notify）。処理時間の短いものから変換を開始する
+_conversion_queue = []
+_conversion_sequence = itertools.count()
+_conversion_running = 0
+
+def submit_batch(files, upload_folder, notify, owner=None, session_id=None):
+    """
+    複数のファイルをバッチとして共有ワーカープールに投入する関数
+
+    ファイルは変換・音声認識・議事録生成の各ステージのプールを順に流れ、
+    ステージ間で待ち合わせることなく、完了したものから結果が通知される。
+
+    Args:
+        files (list): (元のファイル名, 保存済みファイルのパス) のリスト
+        upload_folder (str): 変換後のファイルを保存するフォルダ
+        notify (callable): 進捗通知用のコールバック notify(event, data)
+        owner (str): バッチを投入したクライアントの Socket.IO セッションID。切断時に未完了の処理をキャンセルする
+        session_id (str): バッチを投入したブラウザのセッションID。ジョブと結果の所有者として記録する
+
+    Returns:
+        dict: バッチの状態（batch_id と各ファイルの file_id を含む）
+    """
+    batch_id = str(uuid.uuid4())
+    batch = {
+        'batch_id': batch_id,
+        'created_at': time.time(),
+        'session_id': session_id,
+        'files': {}
+    }
+    storage = get_storage()
+    # デコードできないファイルや無音のファイルは変換を始める前に拒否する
+    checks = preflight_many([filepath for _, filepath in files])
+    accepted = []
+    for (filename, filepath), (media, rejection) in zip(files, checks):
+        if rejection:
+            app_logger.warning(f"Batch file rejected by preflight: {filename}: {rejection}")
+            os.remove(filepath)
+            entry = _new_entry(filename, None, upload_folder, owner, session_id=session_id)
+            entry.update(status='error', error=f"このファイルは処理できません: {rejection}")
+            finish_job(entry['job_id'])
+        else:
+            # どのノードでも変換を開始できるよう、アップロードされたファイルをストレージに登録する
+            entry = _new_entry(filename, storage.publish(filepath), upload_folder, owner, media, session_id)
+            accepted.append(entry)
+        batch['files'][entry['file_id']] = entry
+
+    with _lock:
+        _purge_expired_batches()
+        _batches[batch_id] = batch
+
+    app_logger.info(f"Batch {batch_id} submitted with {len(accepted)}/{len(batch['files'])} files accepted")
+    for entry in accepted:
+        _enqueue_conversion(batch_id, entry, notify)
+
+    return get_batch_status(batch_id)
+
+def _enqueue_conversion(batch_id, entry, notify):
+    """ファイルを変換待ちに追加する。推定処理時間が不明なファイルは最後に回す"""
+    eta = entry['eta']['total'] if entry['eta'] else float('inf')
+    with _lock:
+        heapq.heappush(_conversion_queue, (eta, next(_conversion_sequence), batch_id, entry['file_id'], notify))
+    _dispatch_conversions()
+
+def _dispatch_conversions():
+    """
+    空いている変換ワーカーの数だけ、推定処理時間の短いファイルから変換を開始する
+
+    ワーカープールのキューは先着順のため、空きがある分だけを投入して順序を制御する。
+    短いファイルを先に処理することで、バッチ全体の平均の待ち時間を短くする。
+    """
+    global _conversion_running
+    ready = []
+    with _lock:
+        while _conversion_queue and _conversion_running < CONVERSION_WORKERS:
+            _, _, batch_id, file_id, notify = heapq.heappop(_conversion_queue)
+            _conversion_running += 1
+            ready.append((batch_id, file_id, notify))
+    for batch_id, file_id, notify in ready:
+        _conversion_pool.submit(_run_scheduled_conversion, batch_id, file_id, notify)
+
+def _run_scheduled_conversion(batch_id, file_id, notify):
+    global _conversion_running
+    try:
+        _run_conversion(batch_id, file_id, notify)
+    finally:
+        with _lock:
+            _conversion_running -= 1
+        _dispatch_conversions()
+
+def resume_jobs(jobs, notifier):
+    """
+    前回の終了時に中断されたジョブを、完了済みのステージの次から再開する関数
+
+    ジョブはブラウザのセッションごとに1つのバッチにまとめて再開し、元のジョブIDから
+    再開先のバッチを参照できるよう record_resumed で記録する（GET /jobs/<job_id>）。
+
+    Args:
+        jobs (list): lifecycle_service.load_pending_jobs が返すジョブ情報
+        notifier (callable): セッションIDを受け取り、そのセッションへの通知用のコールバック notify(event, data) を返す関数
+
+    Returns:
+        list: 再開したジョブをまとめたバッチのIDのリスト
+    """
+    storage = get_storage()
+    resumable = {}
+    for job in jobs:
+        state = job.get('state', {})
+        if state.get('transcription'):
+            pool, runner = _generation_pool, _run_generation
+        elif state.get('wav_key') and storage.exists(state['wav_key']):
+            pool, runner = _transcription_pool, _run_transcription
+        elif state.get('upload_key') and storage.exists(state['upload_key']):
+            pool, runner = _conversion_pool, _run_conversion
+        else:
+            app_logger.warning(f"Pending job {job.get('job_id')} cannot be resumed: its files are gone")
+            continue
+        entry = _new_entry(state.get('filename', ''), state.get('upload_key'), state.get('upload_folder'),
+                           media=state.get('media'), session_id=state.get('session_id'))
+        entry.update({key: state[key] for key in ('wav_key', 'transcription', 'transcript_id') if state.get(key)})
+        resumable.setdefault(state.get('session_id'), []).append((job.get('job_id'), entry, pool, runner))
+
+    batch_ids = []
+    for session_id, items in resumable.items():
+        batch_id = str(uuid.uuid4())
+        batch = {
+            'batch_id': batch_id,
+            'created_at': time.time(),
+            'session_id': session_id,
+            'files': {entry['file_id']: entry for _, entry, _, _ in items}
+        }
+        with _lock:
+            _batches[batch_id] = batch
+        batch_ids.append(batch_id)
+
+        app_logger.info(f"Resuming {len(items)} interrupted jobs as batch {batch_id}")
+        notify = notifier(session_id)
+        for job_id, entry, pool, runner in items:
+            if job_id:
+                record_resumed(job_id, session_id, batch_id=batch_id, file_id=entry['file_id'])
+            notify('job_resumed', {'job_id': job_id, 'batch_id': batch_id, 'file_id': entry['file_id'],
+                                   'filename': entry['filename']})
+            if runner is _run_conversion:
+                _enqueue_conversion(batch_id, entry, notify)
+            else:
+                pool.submit(runner, batch_id, entry['file_id'], notify)
+    return batch_ids
+
+def get_batch_session(batch_id):
+    """バッチを投入したブラウザのセッションIDを返す。バッチが存在しない場合は None"""
+    with _lock:
+        batch = _batches.get(batch_id)
+        return batch.get('session_id') if batch else None
+
+def _new_entry(filename, upload_key, upload_folder, owner=None, media=None, session_id=None):
+    file_id = str(uuid.uuid4())
+    deadline = new_job_deadline()
+    job_id = start_job('batch', 'queued', owner=owner, deadline=deadline, filename=filename,
+                       upload_key=upload_key, upload_folder=upload_folder, media=media, session_id=session_id)
+    return {
+        'file_id': file_id,
+        'job_id': job_id,
+        'session_id': session_id,
+        'deadline': deadline,
+        'filename': filename,
+        'upload_key': upload_key,
+        'upload_folder': upload_folder,
+        'status': 'queued',
+        'progress': 0,
+        'wav_key': None,
+        'transcription': None,
+        'segment_texts': None,
+        'transcript_id': None,
+        'minutes': None,
+        'minutes_html': None,
+        'api_name': None,
+        'prompt_version': None,
+        'error': None,
+        'media': media,
+        'duration': media['duration'] if media else None,
+        'eta': estimate_processing_time(media['duration'] if media else None),
+        'timings': {}
+    }
+
+def get_batch_status(batch_id, include_results=True):
+    """
+    バッチの状態を返す関数
+
+    Args:
+        batch_id (str): バッチID
+        include_results (bool): 完了したファイルの文字起こしと議事録を含めるかどうか
+
+    Returns:
+        dict: バッチの状態。存在しない場合は None
+    """
+    with _lock:
+        batch = _batches.get(batch_id)
+        if batch is None:
+            return None
+        files = []
+        for entry in batch['files'].values():
+            info = {key: entry[key] for key in ('file_id', 'filename', 'status', 'progress', 'api_name', 'prompt_version', 'transcript_id', 'error', 'duration', 'eta')}
+            if include_results and entry['status'] == 'done':
+                # 索引に保存された文字起こしは /transcripts/<transcript_id>/segments から取得する
+                if not entry['transcript_id']:
+                    info['transcription'] = entry['transcription']
+                info['minutes_html'] = entry['minutes_html']
+            files.append(info)
+
+    completed = sum(1 for f in files if f['status'] in ('done', 'error'))
+    return {
+        'batch_id': batch_id,
+        'total': len(files),
+        'completed': completed,
+        'files': files
+    }
+
+def _purge_expired_batches():
+    """保持期間を過ぎたバッチを削除する（_lock を保持した状態で呼び出す）"""
+    now = time.time()
+    expired = [batch_id for batch_id, batch in _batches.items()
+               if now - batch['created_at'] > BATCH_RETENTION_SECONDS]
+    for batch_id in expired:
+        del _batches[batch_id]
+
+def _get_entry(batch_id, file_id):
+    with _lock:
+        return _batches[batch_id]['files'][file_id]
+
+def _update(batch_id, file_id, notify, **changes):
+    """ファイルの状態を更新し、進捗を通知する"""
+    with _lock:
+        entry = _batches[batch_id]['files'][file_id]
+        entry.update(changes)
+        payload = {
+            'batch_id': batch_id,
+            'file_id': file_id,
+            'filename': entry['filename'],
+            'status': entry['status'],
+            'progress': entry['progress']
+        }
+    notify('batch_progress', payload)
+
+def _fail(batch_id, file_id, notify, message):
+    app_logger.error(f"Batch {batch_id} file {file_id} failed: {message}")
+    _update(batch_id, file_id, notify, status='error', error=message)
+    finish_job(_get_entry(batch_id, file_id)['job_id'])
+    notify('batch_file_done', {'batch_id': batch_id, 'file_id': file_id, 'error': message})
+
+def _cancelled(batch_id, file_id, notify):
+    """ジョブがキャンセル済みまたは期限切れの場合は失敗として記録し、True を返す"""
+    deadline = _get_entry(batch_id, file_id)['deadline']
+    try:
+        deadline.check()
+    except JobCancelledError as e:
+        _fail(batch_id, file_id, notify, str(e))
+        return True
+    return False
+
+def _run_conversion(batch_id, file_id, notify):
+    if _cancelled(batch_id, file_id, notify):
+        return
+    entry = _get_entry(batch_id, file_id)
+    _update(batch_id, file_id, notify, status='converting')
+    update_job(entry['job_id'], 'converting')
+    storage = get_storage()
+    stage_start = time.perf_counter()
+    try:
+        filepath = storage.fetch(entry['upload_key'])
+        wav_file = convert_to_wav(filepath, entry['upload_folder'], deadline=entry['deadline'],
+                                  duration=entry['duration'])
+        wav_key = storage.publish(wav_file)
+        entry['timings']['converting'] = time.perf_counter() - stage_start
+    except JobCancelledError as e:
+        _fail(batch_id, file_id, notify, str(e))
+        return
+    except Exception as e:
+        _fail(batch_id, file_id, notify, f"音声ファイルの変換中にエラーが発生しました: {str(e)}")
+        return
+
+    _update(batch_id, file_id, notify, status='waiting_transcription', wav_key=wav_key)
+    update_job(entry['job_id'], 'waiting_transcription', wav_key=wav_key)
+    _transcription_pool.submit(_run_transcription, batch_id, file_id, notify)
+
+def _run_transcription(batch_id, file_id, notify):
+    if _cancelled(batch_id, file_id, notify):
+        return
+    entry = _get_entry(batch_id, file_id)
+    _update(batch_id, file_id, notify, status='transcribing')
+    update_job(entry['job_id'], 'transcribing')
+
+    def progress_callback(progress):
+        _update(batch_id, file_id, notify, progress=progress)
+
+    stage_start = time.perf_counter()
+    try:
+        wav_file = get_storage().fetch(entry['wav_key'])
+        segments = transcribe_segments(wav_file, progress_callback, entry['deadline'])
+        entry['timings']['transcribing'] = time.perf_counter() - stage_start
+        transcription = join_segments(segments)
+        transcript_id = save_transcript(segments, entry['wav_key'], filename=entry['filename'], batch_id=batch_id,
+                                        session_id=entry['session_id'])
+    except JobCancelledError as e:
+        _fail(batch_id, file_id, notify, str(e))
+        return
+    except Exception as e:
+        _fail(batch_id, file_id, notify, f"音声認識中にエラーが発生しました: {str(e)}")
+        return
+
+    _update(batch_id, file_id, notify, status='waiting_generation', transcription=transcription,
+            segment_texts=[segment['text'] for segment in segments], transcript_id=transcript_id)
+    update_job(entry['job_id'], 'waiting_generation', transcription=transcription, transcript_id=transcript_id)
+    _generation_pool.submit(_run_generation, batch_id, file_id, notify)
+
+def _run_generation(batch_id, file_id, notify):
+    if _cancelled(batch_id, file_id, notify):
+        return
+    entry = _get_entry(batch_id, file_id)
+    _update(batch_id, file_id, notify, status='generating')
+    update_job(entry['job_id'], 'generating')
+    stage_start = time.perf_counter()
+    try:
+        minutes, api_name, prompt_version = generate_minutes_with_fallback(
+            entry['transcription'], deadline=entry['deadline'], segments=entry['segment_texts'])
+        entry['timings']['generating'] = time.perf_counter() - stage_start
+        minutes_html = render_minutes_html(minutes)
+        # 保存に失敗した場合も失敗として記録する（スレッドプール内の例外は呼び出し元に伝わらないため）
+        if entry['transcript_id']:
+            save_minutes(entry['transcript_id'], minutes, entry['transcription'], api_name, prompt_version)
+            archive_meeting(entry['transcript_id'], filename=entry['filename'], transcription=entry['transcription'],
+                            minutes=minutes, api_name=api_name, prompt_version=prompt_version,
+                            session_id=entry['session_id'])
+    except Exception as e:
+        _fail(batch_id, file_id, notify, str(e))
+        return
+
+    try:
+        _update(batch_id, file_id, notify, status='done', progress=100,
+                minutes=minutes, minutes_html=minutes_html, api_name=api_name,
+                prompt_version=prompt_version)
+    finally:
+        # ジョブが実行中のまま残ると、終了時の待機や再起動後の再開の対象になってしまう
+        finish_job(entry['job_id'])
+    record_timings(entry['duration'], entry['timings'])
+    app_logger.info(f"Batch {batch_id} file {file_id} completed using {api_name}")
+    notify('batch_file_done', {
+        'batch_id': batch_id,
+        'file_id': file_id,
+        'filename': entry['filename'],
+        'api_name': api_name,
+        'prompt_version': prompt_version,
+        'transcript_id': entry['transcript_id'],
+        'minutes_html': minutes_html
+    })
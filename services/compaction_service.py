@@ -0,0 +1,156 @@
+# services/compaction_service.py
+
+import os
+import re
+import unicodedata
+from logger import app_logger
+
+# 議事録生成前に文字起こしを圧縮するかどうか
+COMPACTION_ENABLED = os.environ.get('TRANSCRIPT_COMPACTION', '1') != '0'
+
+# 音声認識の失敗時に挿入されるエラーメッセージ
+ERROR_PLACEHOLDER_PATTERN = re.compile(r'【音声認識サービスでエラーが発生しました:[^】]*】')
+
+_DELIMITER = r'\s、。，．,.!?！？'
+_BOUNDARY = r'(?:(?<=^)|(?<=[' + _DELIMITER + r']))'
+
+# フィラーの直後の読点（フィラーと一緒に取り除き、読点だけが残らないようにする）
+_FILLER_TAIL = r'(?:[、,]\s*)?'
+
+# 伸ばし音を伴うフィラー（区切りの直後にある場合のみ。「じゃあー」などの語尾は対象外）
+ELONGATED_FILLER_PATTERN = re.compile(
+    _BOUNDARY + r'(?:えー+っと|えー+と|えー+|あのー+|そのー+|まあー+|まぁー+|うー+ん|んー+|あー+)' + _FILLER_TAIL
+)
+
+# 区切り（文頭・空白・句読点）に挟まれている場合のみフィラーとみなす語
+DELIMITED_FILLERS = ['えっと', 'ええと', 'ええっと', 'あの', 'まあ', 'まぁ', 'うん']
+DELIMITED_FILLER_PATTERN = re.compile(
+    _BOUNDARY + r'(?:' + '|'.join(DELIMITED_FILLERS) + r')(?:[、,]\s*|(?=$|[' + _DELIMITER + r']))'
+)
+
+# 読点や空白を挟んで繰り返される語句（2〜20文字、数字を除く）。「はい、はい、はい」など
+REPEATED_PHRASE_PATTERN = re.compile(r'([^\d\s、。，．,.]{2,20}?)(?:[、,\s]+\1)+(?=$|[' + _DELIMITER + r'])')
+
+# 区切りなしで3回以上繰り返される4文字以上の語句。「いろいろ」などの畳語を壊さないよう短い語句は対象外とする
+CONSECUTIVE_REPEAT_PATTERN = re.compile(r'([^\d\s]{4,20}?)\1{2,}')
+
+# セグメント境界の重複とみなす最小・最大文字数（かな・漢字を含む重複のみ。英数字の語は対象外）
+MIN_BOUNDARY_OVERLAP = 4
+MAX_BOUNDARY_OVERLAP = 50
+
+_CJK_PATTERN = re.compile(r'[぀-ヿ㐀-䶿一-鿿ｦ-ﾟ]')
+
+def estimate_tokens(text):
+    """
+    テキストのトークン数を概算する関数
+
+    日本語（かな・漢字）は1文字あたり約1トークン、それ以外は4文字あたり約1トークンとして数える。
+    プロバイダごとのトークナイザーとは一致しないが、前後比較や閾値判定には十分な精度がある。
+
+    Args:
+        text (str): 対象のテキスト
+
+    Returns:
+        int: 推定トークン数
+    """
+    if not text:
+        return 0
+    cjk_chars = len(_CJK_PATTERN.findall(text))
+    other_chars = len(text) - cjk_chars - text.count(' ')
+    return cjk_chars + (other_chars + 3) // 4
+
+def compact_transcript(text, segments=None):
+    """
+    議事録生成用に文字起こしを正規化・圧縮する関数
+
+    Unicode正規化、エラーメッセージとフィラーの除去、繰り返しの除去を行う。
+    segments を指定した場合はセグメントごとに圧縮し、隣り合うセグメントの境界で重複している部分も取り除く。
+
+    Args:
+        text (str): 文字起こしテキスト
+        segments (list): text を構成するセグメントのテキスト（join_segments で連結する前のもの）
+
+    Returns:
+        tuple: (圧縮後のテキスト, 統計情報の辞書)
+    """
+    stats = {
+        'original_chars': len(text),
+        'original_tokens': estimate_tokens(text),
+        'removed_errors': 0,
+        'removed_fillers': 0,
+        'removed_repeats': 0,
+        'removed_boundary_overlaps': 0
+    }
+
+    pieces = []
+    for segment in (text,) if segments is None else segments:
+        piece = _compact_segment(segment, stats)
+        if not piece:
+            continue
+        if pieces:
+            # 音声認識のセグメントの継ぎ目でのみ、前のセグメントの末尾と重複する先頭部分を取り除く
+            overlap = _boundary_overlap(pieces[-1], piece)
+            if overlap:
+                stats['removed_boundary_overlaps'] += 1
+                piece = piece[overlap:].strip()
+                if not piece:
+                    continue
+        pieces.append(piece)
+    compacted = ' '.join(pieces)
+
+    stats['compacted_chars'] = len(compacted)
+    stats['compacted_tokens'] = estimate_tokens(compacted)
+    return compacted, stats
+
+def _compact_segment(text, stats):
+    """1つのセグメント（または文字起こし全体）を正規化し、エラーメッセージ・フィラー・繰り返しを取り除く"""
+    compacted = unicodedata.normalize('NFKC', text)
+
+    compacted, count = ERROR_PLACEHOLDER_PATTERN.subn(' ', compacted)
+    stats['removed_errors'] += count
+
+    compacted, count = ELONGATED_FILLER_PATTERN.subn('', compacted)
+    stats['removed_fillers'] += count
+    compacted, count = DELIMITED_FILLER_PATTERN.subn('', compacted)
+    stats['removed_fillers'] += count
+
+    compacted, count = REPEATED_PHRASE_PATTERN.subn(r'\1', compacted)
+    stats['removed_repeats'] += count
+    compacted, count = CONSECUTIVE_REPEAT_PATTERN.subn(r'\1', compacted)
+    stats['removed_repeats'] += count
+
+    return ' '.join(compacted.split())
+
+def _boundary_overlap(previous, current):
+    """前のセグメントの末尾と次のセグメントの先頭で重複している文字数を返す（かな・漢字を含まない重複は 0）"""
+    longest = min(len(previous), len(current), MAX_BOUNDARY_OVERLAP)
+    for size in range(longest, MIN_BOUNDARY_OVERLAP - 1, -1):
+        overlap = current[:size]
+        if previous.endswith(overlap) and _CJK_PATTERN.search(overlap):
+            return size
+    return 0
+
+def prepare_transcript(text, segments=None):
+    """
+    議事録生成の前処理として文字起こしを圧縮し、統計をログに記録する関数
+
+    圧縮が無効な場合や、圧縮によってテキストが空になる場合は元のテキストを返す。
+    segments を指定した場合はセグメントの境界の重複も取り除く（compact_transcript を参照）。
+
+    Returns:
+        tuple: (議事録生成に使用するテキスト, 統計情報の辞書または None)
+    """
+    if not COMPACTION_ENABLED or not text:
+        return text, None
+
+    compacted, stats = compact_transcript(text, segments)
+    if not compacted.strip():
+        app_logger.warning("Transcript compaction produced empty text; using original transcript")
+        return text, None
+
+    saved = stats['original_tokens'] - stats['compacted_tokens']
+    ratio = saved / stats['original_tokens'] * 100 if stats['original_tokens'] else 0
+    app_logger.info(f"Transcript compacted: {stats['original_tokens']} -> {stats['compacted_tokens']} tokens "
+                    f"({ratio:.1f}% saved), fillers={stats['removed_fillers']}, errors={stats['removed_errors']}, "
+                    f"repeats={stats['removed_repeats']}, overlaps={stats['removed_boundary_overlaps']}")
+    return compacted, stats
@@ -0,0 +1,82 @@
+# services/deadline_service.py
+
+import os
+import time
+import threading
+
+# 1つのジョブ（変換・音声認識・議事録生成）に許可する最大時間（秒）
+JOB_DEADLINE_SECONDS = float(os.environ.get('JOB_DEADLINE_SECONDS', 2 * 60 * 60))
+
+# 議事録生成APIの1リクエストあたりの最大時間（秒）。期限がない場合にも適用する
+LLM_REQUEST_TIMEOUT = float(os.environ.get('LLM_REQUEST_TIMEOUT', 300))
+
+class JobCancelledError(Exception):
+    """ジョブがクライアントの切断や明示的な操作によってキャンセルされた場合に発生する例外"""
+
+class DeadlineExceededError(JobCancelledError):
+    """ジョブの期限を過ぎた場合に発生する例外"""
+
+class Deadline:
+    """
+    ジョブの期限とキャンセル状態を保持するクラス
+
+    変換・音声認識・議事録生成の各ステージに渡され、各ステージは残り時間に応じて
+    タイムアウトを設定し、期限切れやキャンセルを検知した時点で処理を打ち切る。
+    """
+
+    def __init__(self, budget_seconds=None):
+        self.started_at = time.time()
+        self.expires_at = self.started_at + budget_seconds if budget_seconds else None
+        self.reason = None
+        self._cancelled = threading.Event()
+
+    def remaining(self):
+        """残り時間（秒）。期限がない場合は None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.time())
+
+    def expired(self):
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self, reason='cancelled'):
+        """ジョブをキャンセルする"""
+        self.reason = reason
+        self._cancelled.set()
+
+    def done(self):
+        """キャンセルされたか、期限を過ぎたかどうかを返す"""
+        return self.cancelled or self.expired()
+
+    def check(self):
+        """キャンセルされている、または期限を過ぎている場合に例外を送出する"""
+        if self.cancelled:
+            raise JobCancelledError(f"ジョブがキャンセルされました ({self.reason})")
+        if self.expired():
+            raise DeadlineExceededError("処理の制限時間を超えました")
+
+    def timeout(self, default=None):
+        """残り時間と default の小さい方を返す（どちらもない場合は None）"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if default is None:
+            return remaining
+        return min(remaining, default)
+
+def new_job_deadline():
+    """設定された制限時間でジョブの期限を作成する"""
+    return Deadline(JOB_DEADLINE_SECONDS)
+
+def check_deadline(deadline):
+    """deadline が None の場合は何もしない Deadline.check"""
+    if deadline is not None:
+        deadline.check()
+
+def timeout_for(deadline, default=None):
+    """deadline が None の場合は default を返す Deadline.timeout"""
+    return default if deadline is None else deadline.timeout(default)
@@ -0,0 +1,115 @@
+# services/eta_service.py
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from logger import app_logger
+
+# ステージごとの処理時間の記録を保存するファイル
+TIMINGS_PATH = os.environ.get('TIMINGS_PATH', os.path.join('uploads', '_timings.jsonl'))
+
+# 推定に使用する直近の記録の件数
+TIMING_HISTORY = 500
+
+# この件数未満の記録しかないステージは既定の係数で推定する
+MIN_TIMING_SAMPLES = 5
+
+# 推定するステージ
+ETA_STAGES = ('converting', 'transcribing', 'generating')
+
+# 記録がない場合の既定の係数（固定の秒数, 音声1秒あたりの秒数）
+DEFAULT_COEFFICIENTS = {
+    'converting': (2.0, 0.01),
+    'transcribing': (5.0, 0.1),
+    'generating': (20.0, 0.01)
+}
+
+_history = deque(maxlen=TIMING_HISTORY)
+_lock = threading.Lock()
+_loaded = False
+_coefficients = {}
+
+def _load():
+    """保存された記録を読み込む（_lock を保持した状態で呼び出す）"""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    if not os.path.exists(TIMINGS_PATH):
+        return
+    with open(TIMINGS_PATH, encoding='utf-8') as f:
+        for line in f:
+            try:
+                _history.append(json.loads(line))
+            except ValueError:
+                continue
+    _fit()
+    app_logger.info(f"Loaded {len(_history)} timing records from {TIMINGS_PATH}")
+
+def _fit():
+    """ステージごとに、処理時間 = 固定の秒数 + 音声の長さ × 係数 を最小二乗法で求める（_lock を保持した状態で呼び出す）"""
+    for stage in ETA_STAGES:
+        points = [(r['duration'], r['stages'][stage]) for r in _history if stage in r.get('stages', {})]
+        if len(points) < MIN_TIMING_SAMPLES:
+            _coefficients.pop(stage, None)
+            continue
+        n = len(points)
+        mean_x = sum(x for x, _ in points) / n
+        mean_y = sum(y for _, y in points) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in points)
+        if var_x > 0:
+            slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+            intercept = mean_y - slope * mean_x
+        else:
+            slope, intercept = 0.0, mean_y
+        if slope < 0 or intercept < 0:
+            # 負の係数は記録が少ない場合の外れ値の影響のため、原点を通る直線で近似し直す
+            slope = max(0.0, sum(x * y for x, y in points) / (sum(x * x for x, _ in points) or 1))
+            intercept = 0.0
+        _coefficients[stage] = (intercept, slope)
+
+def record_timings(duration, stage_seconds):
+    """
+    完了したジョブのステージごとの処理時間を記録し、推定の係数を更新する関数
+
+    Args:
+        duration (float): 音声の長さ（秒）
+        stage_seconds (dict): ステージ名 -> 処理時間（秒）
+    """
+    stages = {stage: round(seconds, 3) for stage, seconds in stage_seconds.items() if stage in ETA_STAGES}
+    if not duration or not stages:
+        return
+    record = {'at': time.time(), 'duration': round(duration, 3), 'stages': stages}
+    with _lock:
+        _load()
+        _history.append(record)
+        _fit()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(TIMINGS_PATH)), exist_ok=True)
+            with open(TIMINGS_PATH, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            app_logger.warning(f"Failed to save timing record: {str(e)}")
+
+def estimate_processing_time(duration):
+    """
+    音声の長さから、過去の処理時間の記録をもとに処理にかかる時間を推定する関数
+
+    Args:
+        duration (float): 音声の長さ（秒）。不明な場合は None
+
+    Returns:
+        dict: stages（ステージ名 -> 推定秒数）, total（合計秒数）, fitted（記録から推定したステージ）。
+            duration が None の場合は None
+    """
+    if not duration:
+        return None
+    with _lock:
+        _load()
+        coefficients = dict(DEFAULT_COEFFICIENTS, **_coefficients)
+        fitted = [stage for stage in ETA_STAGES if stage in _coefficients]
+    stages = {stage: round(intercept + slope * duration, 1)
+              for stage, (intercept, slope) in coefficients.items()}
+    return {'stages': stages, 'total': round(sum(stages.values()), 1), 'fitted': fitted}
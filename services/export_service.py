@@ -0,0 +1,245 @@
+# services/export_service.py
+
+import re
+import json
+import time
+import hashlib
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from flask import send_file
+from services.file_service import generate_filename, format_content
+from services.pipeline_service import render_minutes_html
+from logger import app_logger
+
+# キャッシュするエクスポート結果の最大数
+EXPORT_CACHE_SIZE = 256
+
+# ダウンロードのキャッシュ有効期間（秒）。議事録を再生成しても URL（/download/<形式>）は変わらないため、
+# ブラウザには毎回 ETag で再検証させる（内容が変わっていなければ 304 を返す）
+EXPORT_MAX_AGE = 0
+
+# 旧URL (/download/text, /download/markdown) との互換性のための別名
+FORMAT_ALIASES = {
+    'text': 'txt',
+    'markdown': 'md'
+}
+
+# (content_hash, format) -> エクスポート結果
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+class ExportUnavailableError(Exception):
+    """エクスポートに必要なライブラリがインストールされていない場合に発生する例外"""
+
+def _render_txt(minutes):
+    content = re.sub(r'#+ ', '', minutes)  # 見出しの '#' を削除
+    return format_content(content).encode('utf-8')
+
+def _render_md(minutes):
+    return format_content(minutes).encode('utf-8')
+
+def _render_html(minutes):
+    title = _extract_title(minutes)
+    body = render_minutes_html(minutes)
+    html = (
+        '<!DOCTYPE html>\n'
+        '<html lang="ja">\n'
+        '<head>\n'
+        '<meta charset="UTF-8">\n'
+        f'<title>{_escape_html(title)}</title>\n'
+        '</head>\n'
+        f'<body>\n{body}\n</body>\n'
+        '</html>\n'
+    )
+    return html.encode('utf-8')
+
+def _render_json(minutes):
+    document = {
+        'title': _extract_title(minutes),
+        'minutes': minutes,
+        'sections': [
+            {'level': level, 'heading': heading, 'body': body}
+            for level, heading, body in _split_sections(minutes)
+        ]
+    }
+    return json.dumps(document, ensure_ascii=False, indent=2).encode('utf-8')
+
+def _render_docx(minutes):
+    try:
+        from docx import Document
+    except ImportError:
+        raise ExportUnavailableError("python-docx がインストールされていません")
+
+    document = Document()
+    for line in minutes.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped == '---':
+            continue
+        heading = re.match(r'^(#{1,6})\s*(.+)$', stripped)
+        bullet = re.match(r'^[-*]\s+(.+)$', stripped)
+        numbered = re.match(r'^\d+\.\s+(.+)$', stripped)
+        if heading:
+            document.add_heading(_strip_inline_markup(heading.group(2)), level=min(len(heading.group(1)), 4))
+        elif bullet:
+            document.add_paragraph(_strip_inline_markup(bullet.group(1)), style='List Bullet')
+        elif numbered:
+            document.add_paragraph(_strip_inline_markup(numbered.group(1)), style='List Number')
+        else:
+            document.add_paragraph(_strip_inline_markup(stripped.lstrip('> ')))
+
+    buffer = BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+def _render_pdf(minutes):
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    except ImportError:
+        raise ExportUnavailableError("reportlab がインストールされていません")
+
+    # 日本語を表示するためにCIDフォントを使用する
+    font_name = 'HeiseiKakuGo-W5'
+    pdfmetrics.registerFont(UnicodeCIDFont(font_name))
+    styles = getSampleStyleSheet()
+    body_style = ParagraphStyle('MinutesBody', parent=styles['BodyText'], fontName=font_name, fontSize=10.5, leading=16)
+    heading_styles = {
+        level: ParagraphStyle(f'MinutesHeading{level}', parent=styles[f'Heading{min(level, 4)}'], fontName=font_name)
+        for level in range(1, 7)
+    }
+
+    story = []
+    for line in minutes.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped == '---':
+            story.append(Spacer(1, 6))
+            continue
+        heading = re.match(r'^(#{1,6})\s*(.+)$', stripped)
+        if heading:
+            text = _escape_html(_strip_inline_markup(heading.group(2)))
+            story.append(Paragraph(text, heading_styles[len(heading.group(1))]))
+        else:
+            text = _escape_html(_strip_inline_markup(stripped))
+            text = re.sub(r'^[-*]\s+', '・', text)
+            story.append(Paragraph(text, body_style))
+
+    buffer = BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4, title=_extract_title(minutes)).build(story)
+    return buffer.getvalue()
+
+# フォーマット -> (拡張子, MIMEタイプ, レンダラー)
+EXPORT_FORMATS = {
+    'txt': ('txt', 'text/plain', _render_txt),
+    'md': ('md', 'text/markdown', _render_md),
+    'html': ('html', 'text/html', _render_html),
+    'json': ('json', 'application/json', _render_json),
+    'docx': ('docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document', _render_docx),
+    'pdf': ('pdf', 'application/pdf', _render_pdf)
+}
+
+def normalize_format(file_type):
+    """URLで指定されたファイルタイプを正規のフォーマット名に変換する。未対応の場合は None"""
+    fmt = FORMAT_ALIASES.get(file_type, file_type)
+    return fmt if fmt in EXPORT_FORMATS else None
+
+def content_hash(minutes):
+    return hashlib.sha256(minutes.encode('utf-8')).hexdigest()
+
+def render_export(minutes, fmt):
+    """
+    議事録を指定されたフォーマットに変換する関数
+
+    変換結果は議事録の内容のハッシュ値とフォーマットをキーにキャッシュされ、
+    同じ内容の2回目以降のダウンロードでは再変換を行わない。
+
+    Args:
+        minutes (str): 議事録の内容（マークダウン）
+        fmt (str): フォーマット名（txt, md, html, json, docx, pdf）
+
+    Returns:
+        dict: filename, data, mimetype, etag, last_modified を含むエクスポート結果
+
+    Raises:
+        ExportUnavailableError: フォーマットに必要なライブラリがない場合
+    """
+    digest = content_hash(minutes)
+    key = (digest, fmt)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+            app_logger.debug(f"Export cache hit: {fmt} {digest[:12]}")
+            return entry
+
+    extension, mimetype, renderer = EXPORT_FORMATS[fmt]
+    start_time = time.time()
+    data = renderer(minutes)
+    entry = {
+        'filename': generate_filename(minutes, f'minutes_{extension}') + f'.{extension}',
+        'data': data,
+        'mimetype': mimetype,
+        'etag': f'{digest[:32]}-{fmt}',
+        'last_modified': time.time()
+    }
+    app_logger.info(f"Rendered {fmt} export ({len(data)} bytes) in {time.time() - start_time:.3f}s")
+
+    with _cache_lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > EXPORT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return entry
+
+def send_export(entry):
+    """
+    エクスポート結果をダウンロード用のレスポンスとして返す関数
+
+    ETag / Last-Modified を付与し、If-None-Match などの条件付きリクエストには 304 を、
+    Range リクエストには 206 を返す。
+    """
+    response = send_file(
+        BytesIO(entry['data']),
+        mimetype=entry['mimetype'],
+        as_attachment=True,
+        download_name=entry['filename'],
+        etag=entry['etag'],
+        last_modified=entry['last_modified'],
+        conditional=True,
+        max_age=EXPORT_MAX_AGE
+    )
+    # 議事録はセッションごとの内容のため共有キャッシュには保存させず、使用する前に必ず再検証させる
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def _extract_title(minutes):
+    title_match = re.search(r'^#\s*(.+)$', minutes, re.MULTILINE)
+    return _strip_inline_markup(title_match.group(1)) if title_match else "議事録"
+
+def _split_sections(minutes):
+    """マークダウンを見出しごとのセクション (レベル, 見出し, 本文) に分割する"""
+    sections = []
+    level, heading, body = 0, '', []
+    for line in minutes.splitlines():
+        match = re.match(r'^(#{1,6})\s*(.+)$', line.strip())
+        if match:
+            if heading or any(l.strip() for l in body):
+                sections.append((level, heading, '\n'.join(body).strip()))
+            level, heading, body = len(match.group(1)), match.group(2).strip(), []
+        else:
+            body.append(line)
+    if heading or any(l.strip() for l in body):
+        sections.append((level, heading, '\n'.join(body).strip()))
+    return sections
+
+def _strip_inline_markup(text):
+    text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)
+    text = re.sub(r'\*(.+?)\*', r'\1', text)
+    return text
+
+def _escape_html(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
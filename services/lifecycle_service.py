@@ -0,0 +1,264 @@
+# services/lifecycle_service.py
+
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from services.storage_service import get_storage
+from logger import app_logger
+
+# 終了シグナルを受けてから実行中の処理の完了を待つ時間（秒）
+DRAIN_GRACE_PERIOD = float(os.environ.get('DRAIN_GRACE_PERIOD', 120))
+
+# 待機中に進捗をログに記録する間隔（秒）
+DRAIN_REPORT_INTERVAL = 5
+
+# 再起動後に再開したジョブの引き継ぎ先を保存するストレージ上のフォルダ
+RESUMED_PREFIX = '_resumed'
+
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f-]{36}$')
+
+# 実行中のジョブ（job_id -> ジョブ情報）
+_jobs = {}
+
+# ジョブのキャンセル制御（job_id -> (所有者, Deadline)）。保存対象には含めない
+_controls = {}
+_lock = threading.Lock()
+
+_drain = {
+    'draining': False,
+    'started_at': None,
+    'grace_period': None,
+    'persisted': 0
+}
+
+def is_draining():
+    """終了処理中（新しいアップロードを受け付けない状態）かどうかを返す"""
+    return _drain['draining']
+
+def start_job(kind, stage, owner=None, deadline=None, **state):
+    """
+    実行中のジョブを登録する関数
+
+    Args:
+        kind (str): ジョブの種類（upload, batch など）
+        stage (str): 現在のステージ（converting, transcribing, generating）
+        owner (str): ジョブを所有するクライアント（Socket.IO のセッションID）。切断時にキャンセルする
+        deadline (Deadline): キャンセル時に通知するジョブの期限
+        **state: 中断時に再開するために必要な情報（filepath, wav_file, transcription など）
+
+    Returns:
+        str: ジョブID
+    """
+    job_id = str(uuid.uuid4())
+    with _lock:
+        _jobs[job_id] = {
+            'job_id': job_id,
+            'kind': kind,
+            'stage': stage,
+            'started_at': time.time(),
+            'state': dict(state)
+        }
+        if deadline is not None:
+            _controls[job_id] = (owner, deadline)
+    return job_id
+
+def update_job(job_id, stage, **state):
+    """ジョブのステージと再開用の情報を更新する"""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job['stage'] = stage
+            job['state'].update(state)
+
+def finish_job(job_id):
+    """ジョブを実行中の一覧から取り除く"""
+    with _lock:
+        _jobs.pop(job_id, None)
+        _controls.pop(job_id, None)
+
+def cancel_job(job_id, reason='cancelled'):
+    """
+    ジョブをキャンセルする関数
+
+    Returns:
+        bool: キャンセル対象のジョブが見つかった場合は True
+    """
+    with _lock:
+        control = _controls.get(job_id)
+    if control is None:
+        return False
+    control[1].cancel(reason)
+    app_logger.info(f"Job {job_id} cancelled: {reason}")
+    return True
+
+def get_job(job_id):
+    """実行中のジョブの種類とステージを返す。見つからない場合は None"""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return {'job_id': job_id, 'kind': job['kind'], 'stage': job['stage'], 'started_at': job['started_at']}
+
+def record_resumed(job_id, session_id, **location):
+    """
+    再起動前のジョブをどこで再開したか（batch_id, file_id など）を記録する
+
+    どのノードで再開しても元のジョブIDから参照できるよう、ストレージに保存する。
+    """
+    if not _JOB_ID_PATTERN.match(job_id or ''):
+        return
+    record = dict(location, job_id=job_id, session_id=session_id, resumed_at=time.time())
+    get_storage().write_bytes(f"{RESUMED_PREFIX}/{job_id}.json", json.dumps(record).encode('utf-8'))
+
+def get_resumed(job_id):
+    """record_resumed で記録した再開先を返す。記録がない場合は None"""
+    if not _JOB_ID_PATTERN.match(job_id or ''):
+        return None
+    data = get_storage().read_bytes(f"{RESUMED_PREFIX}/{job_id}.json")
+    return json.loads(data.decode('utf-8')) if data is not None else None
+
+def is_job_owner(job_id, sid=None, session_id=None):
+    """
+    ジョブを要求したクライアント（Socket.IO のセッションID）またはブラウザのセッションかどうかを返す
+
+    セッションIDはジョブの再開用情報（state の session_id）として保存されたものと比較する。
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        control = _controls.get(job_id)
+    if sid and control is not None and control[0] == sid:
+        return True
+    return bool(session_id) and job is not None and job['state'].get('session_id') == session_id
+
+def cancel_jobs_for_owner(owner, reason='client disconnected'):
+    """
+    クライアントが所有するすべてのジョブをキャンセルする関数
+
+    Returns:
+        int: キャンセルしたジョブの数
+    """
+    if not owner:
+        return 0
+    with _lock:
+        job_ids = [job_id for job_id, (job_owner, _) in _controls.items() if job_owner == owner]
+    for job_id in job_ids:
+        cancel_job(job_id, reason)
+    return len(job_ids)
+
+@contextmanager
+def track_job(kind, stage, owner=None, deadline=None, **state):
+    """with 文のブロックの間、ジョブを実行中として登録する"""
+    job_id = start_job(kind, stage, owner, deadline, **state)
+    try:
+        yield job_id
+    finally:
+        finish_job(job_id)
+
+def get_drain_status(include_jobs=False):
+    """
+    終了処理の進捗（残りのジョブ数、経過時間など）を返す
+
+    include_jobs が True の場合は、実行中の各ジョブ（ID・種類・ステージ・経過時間）も含める（管理者用）。
+    """
+    with _lock:
+        jobs = [
+            {'job_id': job['job_id'], 'kind': job['kind'], 'stage': job['stage'],
+             'running_seconds': time.time() - job['started_at']}
+            for job in _jobs.values()
+        ]
+    elapsed = time.time() - _drain['started_at'] if _drain['started_at'] else None
+    return {
+        'draining': _drain['draining'],
+        'elapsed_seconds': elapsed,
+        'grace_period': _drain['grace_period'],
+        'active_jobs': len(jobs),
+        'persisted_jobs': _drain['persisted'],
+        **({'jobs': jobs} if include_jobs else {})
+    }
+
+def drain(pending_dir, grace_period=None, notify=None):
+    """
+    新しいジョブの受け付けを止め、実行中のジョブの完了を待つ関数
+
+    猶予時間内に完了しなかったジョブは、再起動後に再開できるよう pending_dir に保存する。
+
+    Args:
+        pending_dir (str): 未完了のジョブを保存するフォルダ
+        grace_period (float): 完了を待つ最大時間（秒）。省略時は DRAIN_GRACE_PERIOD
+        notify (callable): 進捗通知用のコールバック notify(event, data)
+
+    Returns:
+        int: 保存したジョブの数
+    """
+    grace_period = DRAIN_GRACE_PERIOD if grace_period is None else grace_period
+    _drain.update({'draining': True, 'started_at': time.time(), 'grace_period': grace_period})
+    app_logger.info(f"Draining: waiting up to {grace_period:.0f}s for {len(_jobs)} running jobs")
+    if notify:
+        notify('server_draining', {'grace_period': grace_period})
+
+    deadline = time.time() + grace_period
+    last_report = 0
+    while _jobs and time.time() < deadline:
+        if time.time() - last_report >= DRAIN_REPORT_INTERVAL:
+            status = get_drain_status()
+            app_logger.info(f"Draining: {status['active_jobs']} jobs remaining, "
+                            f"{deadline - time.time():.0f}s left in grace period")
+            last_report = time.time()
+        time.sleep(0.5)
+
+    persisted = persist_jobs(pending_dir)
+    _drain['persisted'] = persisted
+    app_logger.info(f"Drain finished: {persisted} unfinished jobs persisted to {pending_dir}")
+    return persisted
+
+def persist_jobs(pending_dir):
+    """実行中のジョブの再開用情報をJSONファイルとして保存する"""
+    with _lock:
+        jobs = list(_jobs.values())
+    if not jobs:
+        return 0
+
+    os.makedirs(pending_dir, exist_ok=True)
+    for job in jobs:
+        path = os.path.join(pending_dir, f"{job['job_id']}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        app_logger.info(f"Persisted unfinished {job['kind']} job {job['job_id']} at stage {job['stage']}")
+    return len(jobs)
+
+def load_pending_jobs(pending_dir):
+    """
+    前回の終了時に保存されたジョブを読み込む関数
+
+    ファイルは読み込む前に名前を変更して確保するため、複数のワーカーが同時に起動しても
+    同じジョブが二重に再開されることはない。
+
+    Returns:
+        list: 保存されていたジョブ情報のリスト
+    """
+    if not os.path.isdir(pending_dir):
+        return []
+
+    jobs = []
+    for name in sorted(os.listdir(pending_dir)):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(pending_dir, name)
+        claimed_path = f"{path}.{os.getpid()}"
+        try:
+            os.rename(path, claimed_path)
+        except OSError:
+            # 他のワーカーが先に確保した
+            continue
+        try:
+            with open(claimed_path, encoding='utf-8') as f:
+                jobs.append(json.load(f))
+        except (OSError, ValueError) as e:
+            app_logger.error(f"Failed to load pending job {path}: {str(e)}")
+            continue
+        os.remove(claimed_path)
+    return jobs
@@ -0,0 +1,249 @@
+# services/live_service.py
+
+import os
+import uuid
+import wave
+import threading
+import concurrent.futures
+import speech_recognition as sr
+from pydub import AudioSegment
+from services.transcription_service import (
+    recognize_google, join_segments, ERROR_PLACEHOLDER,
+    SEGMENT_OK, SEGMENT_EMPTY, SEGMENT_ERROR, SEGMENT_SKIPPED
+)
+from services.transcript_store import save_transcript, save_minutes
+from services.pipeline_service import generate_minutes_with_fallback, render_minutes_html
+from services.archive_service import archive_meeting
+from services.storage_service import get_storage
+from services.lifecycle_service import start_job, update_job, finish_job
+from services.deadline_service import new_job_deadline
+from logger import app_logger
+
+# ブラウザから送られる音声のフォーマット（16kHz / モノラル / 16bit PCM）
+LIVE_SAMPLE_RATE = 16000
+LIVE_CHANNELS = 1
+LIVE_SAMPLE_WIDTH = 2
+
+# 1回の認識に使用する音声の長さ（秒）
+LIVE_WINDOW_SECONDS = float(os.environ.get('LIVE_WINDOW_SECONDS', 15))
+
+# 区切り位置を探す範囲（秒）。窓の末尾のこの範囲で最も静かな位置で区切り、発話の途中で切れにくくする
+LIVE_SPLIT_SEARCH_SECONDS = 2.0
+
+# 1回の録音の最大時間（秒）
+LIVE_MAX_SECONDS = float(os.environ.get('LIVE_MAX_SECONDS', 4 * 60 * 60))
+
+# 1回の live_chunk で受け付ける最大サイズ（バイト）。5秒分
+LIVE_MAX_CHUNK_BYTES = 5 * LIVE_SAMPLE_RATE * LIVE_CHANNELS * LIVE_SAMPLE_WIDTH
+
+# 録音中の音声認識を行うワーカー数（全セッションで共有）
+LIVE_RECOGNITION_WORKERS = int(os.environ.get('LIVE_RECOGNITION_WORKERS', 4))
+
+_BYTES_PER_MS = LIVE_SAMPLE_RATE * LIVE_CHANNELS * LIVE_SAMPLE_WIDTH // 1000
+
+_recognition_pool = concurrent.futures.ThreadPoolExecutor(max_workers=LIVE_RECOGNITION_WORKERS, thread_name_prefix='live-recognize')
+_finalize_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix='live-finalize')
+
+# live_id -> 録音セッションの状態
+_sessions = {}
+_lock = threading.Lock()
+
+class LiveSessionError(Exception):
+    """録音セッションが存在しない、または受け付けられない音声が送られた場合に発生する例外"""
+
+def start_live(owner, upload_folder, notify, session_id=None):
+    """
+    ライブ文字起こしのセッションを開始する関数
+
+    受信した音声はWAVファイルに追記しながら、LIVE_WINDOW_SECONDS ごとの窓に区切って
+    順次認識し、結果を live_partial イベントで通知する。
+
+    Args:
+        owner (str): 録音しているクライアントの Socket.IO セッションID
+        upload_folder (str): 録音したWAVファイルを保存するフォルダ
+        notify (callable): 録音しているクライアントへの通知用のコールバック notify(event, data)
+        session_id (str): 録音しているブラウザのセッションID。文字起こしの所有者として記録する
+
+    Returns:
+        str: セッションID (live_id)
+    """
+    live_id = str(uuid.uuid4())
+    os.makedirs(upload_folder, exist_ok=True)
+    wav_file = os.path.join(upload_folder, f"live_{live_id}.wav")
+    writer = wave.open(wav_file, 'wb')
+    writer.setnchannels(LIVE_CHANNELS)
+    writer.setsampwidth(LIVE_SAMPLE_WIDTH)
+    writer.setframerate(LIVE_SAMPLE_RATE)
+
+    deadline = new_job_deadline()
+    job_id = start_job('live', 'recording', owner=owner, deadline=deadline, wav_file=wav_file, session_id=session_id)
+    with _lock:
+        _sessions[live_id] = {
+            'live_id': live_id,
+            'job_id': job_id,
+            'owner': owner,
+            'session_id': session_id,
+            'deadline': deadline,
+            'notify': notify,
+            'wav_file': wav_file,
+            'writer': writer,
+            'buffer': bytearray(),
+            'buffer_start': 0,   # buffer の先頭の録音開始からの位置（ミリ秒）
+            'received_ms': 0,
+            'segments': {},      # 窓の番号 -> セグメント
+            'futures': [],
+            'lock': threading.Lock()
+        }
+    app_logger.info(f"Live session {live_id} started for client {owner}")
+    return live_id
+
+def _get_session(live_id, owner):
+    with _lock:
+        session = _sessions.get(live_id)
+    if session is None or session['owner'] != owner:
+        raise LiveSessionError("録音セッションが見つかりません")
+    return session
+
+def add_chunk(live_id, owner, data):
+    """
+    ブラウザから受信した音声（16kHz / モノラル / 16bit PCM）をセッションに追加する関数
+
+    窓の長さ分の音声がたまると、最も静かな位置で区切って認識ワーカーに投入する。
+
+    Raises:
+        LiveSessionError: セッションが存在しない、または音声が不正な場合
+    """
+    session = _get_session(live_id, owner)
+    if not isinstance(data, (bytes, bytearray)) or len(data) > LIVE_MAX_CHUNK_BYTES:
+        raise LiveSessionError("音声データの形式が正しくありません")
+    if session['deadline'].done():
+        raise LiveSessionError("録音セッションは終了しています")
+
+    with session['lock']:
+        data = bytes(data[:len(data) - len(data) % LIVE_SAMPLE_WIDTH])
+        if session['received_ms'] + len(data) // _BYTES_PER_MS > LIVE_MAX_SECONDS * 1000:
+            raise LiveSessionError("録音の最大時間を超えました")
+        session['writer'].writeframes(data)
+        session['buffer'].extend(data)
+        session['received_ms'] += len(data) // _BYTES_PER_MS
+
+        window_bytes = int(LIVE_WINDOW_SECONDS * 1000) * _BYTES_PER_MS
+        while len(session['buffer']) >= window_bytes:
+            split = _find_split(session['buffer'], window_bytes)
+            _submit_window(session, bytes(session['buffer'][:split]))
+            del session['buffer'][:split]
+
+def _find_split(buffer, window_bytes):
+    """窓の末尾 LIVE_SPLIT_SEARCH_SECONDS の範囲で、最も音量の小さい100ミリ秒の位置を返す（バイト単位）"""
+    step = 100 * _BYTES_PER_MS
+    search_start = max(step, window_bytes - int(LIVE_SPLIT_SEARCH_SECONDS * 1000) * _BYTES_PER_MS)
+    best_offset, best_rms = window_bytes, None
+    for offset in range(search_start, window_bytes - step + 1, step):
+        frame = AudioSegment(data=bytes(buffer[offset:offset + step]), sample_width=LIVE_SAMPLE_WIDTH,
+                             frame_rate=LIVE_SAMPLE_RATE, channels=LIVE_CHANNELS)
+        if best_rms is None or frame.rms < best_rms:
+            best_offset, best_rms = offset + step // 2, frame.rms
+    return best_offset - best_offset % LIVE_SAMPLE_WIDTH
+
+def _submit_window(session, data):
+    """音声の窓を認識ワーカーに投入する（session['lock'] を保持した状態で呼び出す）"""
+    index = len(session['segments'])
+    start = session['buffer_start']
+    end = start + len(data) // _BYTES_PER_MS
+    session['buffer_start'] = end
+    session['segments'][index] = {'index': index, 'start': start, 'end': end, 'text': '', 'status': SEGMENT_SKIPPED}
+    session['futures'].append(_recognition_pool.submit(_recognize_window, session, index, data))
+
+def _recognize_window(session, index, data):
+    segment = session['segments'][index]
+    if session['deadline'].done():
+        return
+    audio = AudioSegment(data=data, sample_width=LIVE_SAMPLE_WIDTH,
+                         frame_rate=LIVE_SAMPLE_RATE, channels=LIVE_CHANNELS)
+    try:
+        text, status = recognize_google(sr.Recognizer(), audio, session['deadline']), SEGMENT_OK
+    except sr.UnknownValueError:
+        text, status = '', SEGMENT_EMPTY
+    except sr.RequestError as e:
+        app_logger.error(f"Live session {session['live_id']} window {index} failed: {str(e)}")
+        text, status = ERROR_PLACEHOLDER.format(error=str(e)), SEGMENT_ERROR
+    except Exception as e:
+        app_logger.error(f"Live session {session['live_id']} window {index} failed: {str(e)}", exc_info=True)
+        text, status = ERROR_PLACEHOLDER.format(error=str(e)), SEGMENT_ERROR
+    segment.update(text=text, status=status)
+    session['notify']('live_partial', {
+        'live_id': session['live_id'],
+        'index': index,
+        'start': segment['start'] / 1000,
+        'end': segment['end'] / 1000,
+        'text': text,
+        'status': status
+    })
+
+def stop_live(live_id, owner, generate=True):
+    """
+    録音を終了し、残りの音声を認識してから文字起こしを保存する関数
+
+    処理はバックグラウンドで行い、完了すると live_done（文字起こし）、
+    generate が True の場合は続けて live_minutes（議事録）を通知する。
+
+    Raises:
+        LiveSessionError: セッションが存在しない場合
+    """
+    session = _get_session(live_id, owner)
+    with _lock:
+        _sessions.pop(live_id, None)
+    with session['lock']:
+        if session['buffer']:
+            _submit_window(session, bytes(session['buffer']))
+            session['buffer'].clear()
+        session['writer'].close()
+    update_job(session['job_id'], 'transcribing')
+    app_logger.info(f"Live session {live_id} stopped after {session['received_ms'] / 1000:.1f}s of audio")
+    return _finalize_pool.submit(_finalize, session, generate)
+
+def stop_live_for_owner(owner):
+    """クライアントが切断した場合に、そのクライアントの録音を議事録を生成せずに終了する"""
+    with _lock:
+        live_ids = [live_id for live_id, session in _sessions.items() if session['owner'] == owner]
+    for live_id in live_ids:
+        stop_live(live_id, owner, generate=False)
+    return len(live_ids)
+
+def _finalize(session, generate):
+    notify = session['notify']
+    try:
+        concurrent.futures.wait(session['futures'])
+        segments = [session['segments'][i] for i in sorted(session['segments'])]
+        transcription = join_segments(segments)
+        wav_key = get_storage().publish(session['wav_file'])
+        transcript_id = save_transcript(segments, wav_key, filename='live', live_id=session['live_id'],
+                                        session_id=session['session_id'])
+        archive_meeting(transcript_id, filename='live', transcription=transcription, session_id=session['session_id'])
+        # 文字起こしは live_partial で送信済みのため、全文は送らない
+        notify('live_done', {
+            'live_id': session['live_id'],
+            'transcript_id': transcript_id,
+            'empty': not transcription.strip(),
+            'duration': session['received_ms'] / 1000
+        })
+        if not generate or not transcription.strip():
+            return
+
+        update_job(session['job_id'], 'generating', transcription=transcription)
+        minutes, api_name, prompt_version = generate_minutes_with_fallback(
+            transcription, notify, session['deadline'], segments=[segment['text'] for segment in segments])
+        save_minutes(transcript_id, minutes, transcription, api_name, prompt_version)
+        archive_meeting(transcript_id, minutes=minutes, api_name=api_name, prompt_version=prompt_version)
+        notify('live_minutes', {
+            'live_id': session['live_id'],
+            'transcript_id': transcript_id,
+            'minutes_html': render_minutes_html(minutes),
+            'api_name': api_name,
+            'prompt_version': prompt_version
+        })
+    except Exception as e:
+        app_logger.error(f"Error finalizing live session {session['live_id']}: {str(e)}", exc_info=True)
+        notify('live_error', {'live_id': session['live_id'], 'error': str(e)})
+    finally:
+        finish_job(session['job_id'])
@@ -0,0 +1,108 @@
+# services/pipeline_service.py
+
+import markdown
+from services.audio_service import convert_to_wav
+from services.transcription_service import transcribe_segments, join_segments
+from services.routing_service import select_routes
+from services.compaction_service import prepare_transcript
+from services.prompt_registry import PROMPT_VERSION
+from services.deadline_service import check_deadline
+from logger import app_logger
+
+# 各議事録生成サービスが失敗時に返すメッセージ
+GENERATION_ERROR_MESSAGE = "議事録の生成中にエラーが発生しました。"
+
+def _noop_notify(event, data):
+    pass
+
+def generate_minutes_with_fallback(transcription, notify=None, deadline=None, prompt_version=None, compact=True,
+                                   segments=None):
+    """
+    議事録生成APIを順番に試行し、最初に成功した結果を返す関数
+
+    試行するプロバイダとモデルは文字起こしの長さに応じて routing_service が選択する。
+
+    Args:
+        transcription (str): 文字起こしテキスト
+        notify (callable): 進捗通知用のコールバック notify(event, data)
+        deadline (Deadline): ジョブの期限。キャンセルや期限切れの場合は次のAPIを試行せずに打ち切る
+        prompt_version (str): 使用するプロンプトのバージョン。省略時は現在のバージョン
+        compact (bool): 文字起こしを圧縮してから送信するかどうか（文字起こし以外を送る場合は False）
+        segments (list): transcription を構成するセグメントのテキスト。指定した場合はセグメントの境界の重複も取り除く
+
+    Returns:
+        tuple: (議事録, 使用したAPI名, プロンプトのバージョン)
+    """
+    notify = notify or _noop_notify
+
+    prompt_version = prompt_version or PROMPT_VERSION
+
+    # フィラーや重複を取り除いてプロンプトのトークン数を削減する
+    prompt_text, stats = prepare_transcript(transcription, segments) if compact else (transcription, None)
+    if stats:
+        notify('transcript_compacted', {
+            'original_tokens': stats['original_tokens'],
+            'compacted_tokens': stats['compacted_tokens']
+        })
+
+    tier, tokens, routes = select_routes(prompt_text)
+    notify('routing', {'tier': tier, 'tokens': tokens})
+
+    for generate_func, api_name, model in routes:
+        check_deadline(deadline)
+        app_logger.info(f"Attempting to generate minutes using {api_name} ({model})")
+        notify('status_update', {'status': f'{api_name} を使用して議事録を生成中...'})
+        minutes = generate_func(prompt_text, model=model, deadline=deadline, prompt_version=prompt_version)
+        if minutes and minutes != GENERATION_ERROR_MESSAGE:
+            app_logger.info(f"Minutes successfully generated using {api_name} ({model})")
+            notify('api_used', {'api_name': api_name, 'model': model, 'prompt_version': prompt_version})
+            return minutes, api_name, prompt_version
+
+    # 全てのツールで失敗
+    check_deadline(deadline)
+    raise Exception("全ての議事録生成ツールでエラーが発生しました。")
+
+def render_minutes_html(minutes):
+    """
+    マークダウン形式の議事録をHTMLに変換する関数
+
+    Flaskのリクエストコンテキスト外（バックグラウンドワーカーなど）からも呼び出せるように
+    テンプレートを介さずに変換する。
+    """
+    return markdown.markdown(minutes)
+
+def run_pipeline(filepath, work_dir, notify=None, progress_callback=None, deadline=None):
+    """
+    音声ファイルの変換・文字起こし・議事録生成を順に実行する関数
+
+    Flaskのリクエストコンテキストやセッションに依存しないため、CLIやバックグラウンド処理から利用できる。
+
+    Args:
+        filepath (str): 入力音声ファイルのパス
+        work_dir (str): 変換後のWAVファイルを保存するフォルダ
+        notify (callable): 進捗通知用のコールバック notify(event, data)
+        progress_callback (callable): 文字起こしの進捗（%）を受け取るコールバック
+        deadline (Deadline): ジョブの期限
+
+    Returns:
+        dict: transcription, minutes, api_name, prompt_version, wav_file を含む処理結果
+    """
+    notify = notify or _noop_notify
+    progress_callback = progress_callback or (lambda progress: None)
+
+    notify('status_update', {'status': 'ファイルを変換中...'})
+    wav_file = convert_to_wav(filepath, work_dir, deadline=deadline)
+
+    notify('status_update', {'status': '音声認識を開始します...'})
+    segments = transcribe_segments(wav_file, progress_callback, deadline)
+    transcription = join_segments(segments)
+
+    minutes, api_name, prompt_version = generate_minutes_with_fallback(
+        transcription, notify, deadline, segments=[segment['text'] for segment in segments])
+    return {
+        'transcription': transcription,
+        'minutes': minutes,
+        'api_name': api_name,
+        'prompt_version': prompt_version,
+        'wav_file': wav_file
+    }
@@ -0,0 +1,205 @@
+# services/preflight_service.py
+
+import os
+import json
+import math
+import subprocess
+import concurrent.futures
+from pydub import AudioSegment
+from services.audio_service import FFPROBE_TIMEOUT
+from services.deadline_service import timeout_for
+from logger import app_logger
+
+# 音量を確認する区間の最小数と、1区間の長さ（秒）
+PREFLIGHT_SAMPLE_COUNT = int(os.environ.get('PREFLIGHT_SAMPLE_COUNT', 6))
+PREFLIGHT_SAMPLE_SECONDS = float(os.environ.get('PREFLIGHT_SAMPLE_SECONDS', 2.0))
+
+# 長いファイルはこの間隔（秒）ごとに1区間を確認する（最大 PREFLIGHT_MAX_SAMPLE_COUNT 区間）
+PREFLIGHT_SAMPLE_SPACING = float(os.environ.get('PREFLIGHT_SAMPLE_SPACING', 60.0))
+PREFLIGHT_MAX_SAMPLE_COUNT = int(os.environ.get('PREFLIGHT_MAX_SAMPLE_COUNT', 30))
+
+# 同時にデコードする区間の数
+SCAN_WORKERS = 6
+
+# すべての区間の音量がこの値（dBFS）を下回る場合は無音とみなす
+SILENCE_THRESHOLD_DBFS = float(os.environ.get('SILENCE_THRESHOLD_DBFS', -55.0))
+
+# 無音とみなしたファイルを拒否する最大の長さ（秒）。これより長いファイルや長さが不明なファイルは、
+# 確認していない区間に音声が含まれている可能性があるため、拒否せずに警告だけを記録する
+SILENCE_REJECT_MAX_SECONDS = float(os.environ.get('SILENCE_REJECT_MAX_SECONDS', 600))
+
+# 受け付ける最小の音声の長さ（秒）
+MIN_AUDIO_SECONDS = 1.0
+
+# 音量の確認に使用するフォーマット（デコードを軽くするため 8kHz / モノラル）
+SCAN_SAMPLE_RATE = 8000
+SCAN_SAMPLE_WIDTH = 2
+
+# 一括アップロードで同時に確認するファイル数
+PREFLIGHT_WORKERS = 4
+
+class PreflightError(Exception):
+    """デコードできない、または無音のファイルなど、処理を開始する前に受け付けを拒否する場合に発生する例外"""
+
+def _float_or_none(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def probe_media(input_file, deadline=None):
+    """
+    ffprobeを使用して入力ファイルの長さ・コーデック・チャンネル構成を取得する関数
+
+    Returns:
+        dict: duration（秒、取得できない場合は None）, format, codec, channels, channel_layout, sample_rate。
+            ffprobe を実行できない環境では None
+
+    Raises:
+        PreflightError: ファイルを解析できない、または音声ストリームが含まれていない場合
+    """
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'a:0',
+        '-show_entries', 'format=duration,format_name:stream=codec_name,channels,channel_layout,sample_rate,duration',
+        '-of', 'json',
+        input_file
+    ]
+    app_logger.debug(f"Executing ffprobe command: {' '.join(command)}")
+    try:
+        result = subprocess.run(command, capture_output=True, text=True,
+                                timeout=timeout_for(deadline, FFPROBE_TIMEOUT))
+    except OSError as e:
+        app_logger.warning(f"ffprobe could not be executed, skipping preflight: {str(e)}")
+        return None
+    except subprocess.TimeoutExpired:
+        raise PreflightError("ファイルの解析がタイムアウトしました")
+
+    if result.returncode != 0:
+        app_logger.warning(f"ffprobe rejected {input_file}: {result.stderr.strip()}")
+        raise PreflightError("音声ファイルとして読み込めません")
+
+    try:
+        data = json.loads(result.stdout or '{}')
+    except ValueError:
+        raise PreflightError("音声ファイルとして読み込めません")
+    streams = data.get('streams') or []
+    if not streams:
+        raise PreflightError("音声が含まれていません")
+
+    stream, media_format = streams[0], data.get('format', {})
+    return {
+        'duration': _float_or_none(media_format.get('duration')) or _float_or_none(stream.get('duration')),
+        'format': media_format.get('format_name'),
+        'codec': stream.get('codec_name'),
+        'channels': stream.get('channels'),
+        'channel_layout': stream.get('channel_layout'),
+        'sample_rate': _float_or_none(stream.get('sample_rate'))
+    }
+
+def _window_dbfs(input_file, start, seconds, deadline=None):
+    """指定した区間だけをデコードして音量（dBFS）を返す。デコードできない場合は None"""
+    command = [
+        'ffmpeg',
+        '-v', 'error',
+        '-ss', f"{start:.3f}",
+        '-t', f"{seconds:.3f}",
+        '-i', input_file,
+        '-vn',
+        '-ac', '1',
+        '-ar', str(SCAN_SAMPLE_RATE),
+        '-f', 's16le',
+        '-'
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=timeout_for(deadline, FFPROBE_TIMEOUT))
+    except (OSError, subprocess.TimeoutExpired) as e:
+        app_logger.warning(f"Energy scan failed at {start:.1f}s: {str(e)}")
+        return None
+    data = result.stdout[:len(result.stdout) - len(result.stdout) % SCAN_SAMPLE_WIDTH]
+    if result.returncode != 0 or not data:
+        return None
+    return AudioSegment(data=data, sample_width=SCAN_SAMPLE_WIDTH, frame_rate=SCAN_SAMPLE_RATE, channels=1).dBFS
+
+def scan_energy(input_file, duration, deadline=None):
+    """
+    ファイル全体に均等に配置した短い区間だけをデコードし、各区間の音量（dBFS）を返す関数
+
+    ファイル全体をデコードせずに、デコードできるかどうかと無音でないかを確認する。
+    区間の数は PREFLIGHT_SAMPLE_SPACING 秒ごとに1つ（PREFLIGHT_SAMPLE_COUNT 〜 PREFLIGHT_MAX_SAMPLE_COUNT 個）とし、
+    長さが不明な場合は先頭の区間だけを確認する。
+
+    Returns:
+        list: 各区間の音量（dBFS）。デコードできなかった区間は None
+    """
+    if not duration:
+        windows = [(0.0, PREFLIGHT_SAMPLE_SECONDS * PREFLIGHT_SAMPLE_COUNT)]
+    elif duration <= PREFLIGHT_SAMPLE_SECONDS * PREFLIGHT_SAMPLE_COUNT:
+        windows = [(0.0, duration)]
+    else:
+        count = min(PREFLIGHT_MAX_SAMPLE_COUNT,
+                    max(PREFLIGHT_SAMPLE_COUNT, math.ceil(duration / PREFLIGHT_SAMPLE_SPACING)))
+        span = duration - PREFLIGHT_SAMPLE_SECONDS
+        windows = [(span * (i + 0.5) / count, PREFLIGHT_SAMPLE_SECONDS) for i in range(count)]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(windows))) as executor:
+        return list(executor.map(lambda window: _window_dbfs(input_file, window[0], window[1], deadline), windows))
+
+def preflight(input_file, deadline=None):
+    """
+    処理を開始する前に、ファイルを解析して受け付けられるかを確認する関数
+
+    ffprobe で長さ・コーデック・チャンネル構成を取得し、いくつかの短い区間の音量を確認する。
+    変換や音声認識を始める前に、壊れたファイルや無音のファイルを拒否する。
+
+    Args:
+        input_file (str): 入力ファイルのパス
+        deadline (Deadline): ジョブの期限
+
+    Returns:
+        dict: probe_media の結果に peak_dbfs（最も大きい区間の音量）と silent_warning（長いファイルで
+            確認したすべての区間が無音だった場合は True）を加えたもの。ffprobe を実行できない環境では None
+
+    Raises:
+        PreflightError: 受け付けられないファイルの場合（メッセージは利用者に表示できる）
+    """
+    media = probe_media(input_file, deadline)
+    if media is None:
+        return None
+    if media['duration'] is not None and media['duration'] < MIN_AUDIO_SECONDS:
+        raise PreflightError("音声が短すぎます")
+
+    levels = scan_energy(input_file, media['duration'], deadline)
+    decoded = [level for level in levels if level is not None]
+    if not decoded:
+        raise PreflightError("音声をデコードできません")
+    peak = max(decoded)
+    silent = peak < SILENCE_THRESHOLD_DBFS
+    if silent and media['duration'] is not None and media['duration'] <= SILENCE_REJECT_MAX_SECONDS:
+        raise PreflightError("音声がほぼ無音です")
+    if silent:
+        app_logger.warning(f"All {len(levels)} sampled windows of {input_file} are silent, accepting with warning")
+
+    media['silent_warning'] = silent
+    media['peak_dbfs'] = round(peak, 1) if math.isfinite(peak) else None
+    app_logger.info(f"Preflight passed for {input_file}: {media}")
+    return media
+
+def preflight_many(input_files):
+    """
+    複数のファイルを並列に確認する関数
+
+    Returns:
+        list: 各ファイルの (preflight の結果, 拒否した理由またはNone)
+    """
+    def check(input_file):
+        try:
+            return preflight(input_file), None
+        except PreflightError as e:
+            return None, str(e)
+
+    if not input_files:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(PREFLIGHT_WORKERS, len(input_files))) as executor:
+        return list(executor.map(check, input_files))
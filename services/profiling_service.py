@@ -0,0 +1,306 @@
+# services/profiling_service.py
+
+import os
+import gc
+import sys
+import json
+import time
+import uuid
+import shutil
+import signal
+import threading
+import traceback
+from collections import Counter, deque
+from contextlib import contextmanager
+import greenlet
+from logger import app_logger
+
+# プロファイル結果を保存するフォルダ
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join('uploads', '_profiles'))
+
+# スタックを採取する間隔（秒）
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+
+# 保存しておく計測結果の最大数（超えた場合は古いものから削除する）
+MAX_SAVED_PROFILES = int(os.environ.get('MAX_SAVED_PROFILES', 50))
+
+# 同時に計測できるリクエストの最大数（計測中はリクエストが少し遅くなるため制限する）
+MAX_ACTIVE_PROFILES = int(os.environ.get('MAX_ACTIVE_PROFILES', 2))
+
+# イベントループをこの時間（秒）以上占有したグリーンレットを記録する
+BLOCKING_THRESHOLD = float(os.environ.get('BLOCKING_THRESHOLD', 0.1))
+
+# 記録するイベントループのブロックの最大件数と、記録するスタックの深さ
+BLOCKING_HISTORY = 100
+BLOCKING_STACK_DEPTH = 15
+
+# 管理者が切り替える設定
+_settings = {
+    'profile_all': False,   # すべてのアップロードを計測する
+    'loop_monitor': False   # イベントループのブロックを記録する
+}
+
+# 計測中のグリーンレット -> Profile
+_active = {}
+_lock = threading.Lock()
+_timer = {'installed': False, 'previous_handler': None}
+
+_loop = {
+    'last_switch': None,
+    'blocks': deque(maxlen=BLOCKING_HISTORY),
+    'total_blocks': 0,
+    'max_seconds': 0.0
+}
+
+class Profile:
+    """1つのリクエストの計測結果（ステージごとの折りたたみスタックと所要時間）"""
+
+    def __init__(self, label, target):
+        self.profile_id = str(uuid.uuid4())
+        self.label = label
+        self.target = target
+        self.started_at = time.time()
+        self.stage = 'request'
+        self.stacks = {}
+        self.stage_seconds = {}
+        self.last_sample = time.perf_counter()
+
+    def add_sample(self, frame, now):
+        # シグナルの処理が遅れた場合（イベントループが待機中など）は、経過時間分のサンプルとして数える
+        weight = max(1, round((now - self.last_sample) / PROFILE_SAMPLE_INTERVAL))
+        self.last_sample = now
+        self.stacks.setdefault(self.stage, Counter())[_fold(frame)] += weight
+
+def _fold(frame):
+    """フレームを flamegraph.pl / speedscope 形式の折りたたみスタック（呼び出し元から ; 区切り）に変換する"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+def get_settings():
+    return dict(_settings)
+
+def update_settings(profile_all=None, loop_monitor=None):
+    """管理者による計測の設定を変更する"""
+    if profile_all is not None:
+        _settings['profile_all'] = bool(profile_all)
+    if loop_monitor is not None:
+        _settings['loop_monitor'] = bool(loop_monitor)
+        if _settings['loop_monitor']:
+            _loop['last_switch'] = time.perf_counter()
+            greenlet.settrace(_trace_switch)
+        else:
+            greenlet.settrace(None)
+    app_logger.info(f"Profiling settings updated: {_settings}")
+    return get_settings()
+
+def should_profile(headers, args, allow_request=False):
+    """
+    管理者の設定、または X-Profile ヘッダー・profile クエリパラメータで計測が要求されているかを返す
+
+    計測中はリクエストが遅くなり結果もディスクに保存されるため、ヘッダーとクエリパラメータは
+    allow_request が True の場合（管理者のリクエスト）だけ受け付ける。
+    """
+    if _settings['profile_all']:
+        return True
+    flag = headers.get('X-Profile') or args.get('profile')
+    return allow_request and (flag or '').lower() in ('1', 'true', 'yes')
+
+def start_profile(label):
+    """
+    現在のグリーンレットの計測を開始する関数
+
+    Args:
+        label (str): 計測結果の一覧に表示する名前
+
+    Returns:
+        Profile: 計測中のプロファイル。同時計測数の上限に達している場合は None
+    """
+    target = greenlet.getcurrent()
+    with _lock:
+        if len(_active) >= MAX_ACTIVE_PROFILES:
+            app_logger.warning(f"Profiling skipped for {label}: {len(_active)} profiles already active")
+            return None
+        profile = Profile(label, target)
+        _active[target] = profile
+        if not _timer['installed']:
+            _install_timer()
+    app_logger.info(f"Profiling started: {profile.profile_id} ({label})")
+    return profile
+
+def stop_profile(profile):
+    """
+    計測を終了し、ステージごとの折りたたみスタックと概要を PROFILE_DIR に保存する関数
+
+    Returns:
+        dict: 計測結果の概要
+    """
+    with _lock:
+        _active.pop(profile.target, None)
+        if not _active and _timer['installed']:
+            _uninstall_timer()
+
+    profile_dir = os.path.join(PROFILE_DIR, profile.profile_id)
+    os.makedirs(profile_dir, exist_ok=True)
+    for stage, stacks in profile.stacks.items():
+        with open(os.path.join(profile_dir, f"{stage}.folded"), 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    summary = {
+        'profile_id': profile.profile_id,
+        'label': profile.label,
+        'started_at': profile.started_at,
+        'duration_seconds': time.time() - profile.started_at,
+        'sample_interval': PROFILE_SAMPLE_INTERVAL,
+        'stages': {
+            stage: {
+                'seconds': profile.stage_seconds.get(stage),
+                'samples': sum(profile.stacks.get(stage, {}).values())
+            }
+            for stage in dict.fromkeys(list(profile.stage_seconds) + list(profile.stacks))
+        }
+    }
+    with open(os.path.join(profile_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False)
+    app_logger.info(f"Profiling finished: {profile.profile_id} ({summary['duration_seconds']:.2f}s)")
+    _prune_profiles()
+    return summary
+
+def _prune_profiles():
+    """保存された計測結果が MAX_SAVED_PROFILES を超えた場合に、古いものから削除する"""
+    try:
+        entries = [entry for entry in os.scandir(PROFILE_DIR) if entry.is_dir()]
+    except OSError:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in entries[MAX_SAVED_PROFILES:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+        app_logger.info(f"Removed old profile: {entry.name}")
+
+@contextmanager
+def profile_stage(name):
+    """
+    with 文のブロックを計測のステージとして記録する
+
+    現在のグリーンレットが計測されていない場合は何もしない（辞書の参照1回のみ）。
+    """
+    profile = _active.get(greenlet.getcurrent())
+    if profile is None:
+        yield
+        return
+
+    previous_stage = profile.stage
+    profile.stage = name
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.stage_seconds[name] = profile.stage_seconds.get(name, 0.0) + time.perf_counter() - start_time
+        profile.stage = previous_stage
+
+def _install_timer():
+    """一定間隔で SIGALRM を発生させてスタックを採取する（シグナルはメインスレッドでのみ設定できる）"""
+    try:
+        _timer['previous_handler'] = signal.signal(signal.SIGALRM, _sample)
+        signal.setitimer(signal.ITIMER_REAL, PROFILE_SAMPLE_INTERVAL, PROFILE_SAMPLE_INTERVAL)
+        _timer['installed'] = True
+    except (ValueError, AttributeError) as e:
+        # スタックは採取できないが、ステージごとの所要時間は記録される
+        app_logger.warning(f"Stack sampling unavailable, recording stage timings only: {str(e)}")
+
+def _uninstall_timer():
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    signal.signal(signal.SIGALRM, _timer['previous_handler'] or signal.SIG_DFL)
+    _timer['installed'] = False
+
+def _sample(signum, frame):
+    """
+    計測中の各グリーンレットのスタックを採取する
+
+    実行中のグリーンレットは割り込まれたフレームを、I/O待ちなどで中断しているグリーンレットは
+    中断した位置のフレームを採取するため、APIの応答待ちの時間も計測結果に含まれる。
+    """
+    now = time.perf_counter()
+    current = greenlet.getcurrent()
+    for target, profile in list(_active.items()):
+        target_frame = frame if target is current else target.gr_frame
+        if target_frame is not None:
+            profile.add_sample(target_frame, now)
+
+def _trace_switch(event, args):
+    """グリーンレットの切り替えごとに、直前のグリーンレットがイベントループを占有した時間を記録する"""
+    if event not in ('switch', 'throw'):
+        return
+    origin, _ = args
+    now = time.perf_counter()
+    ran = now - (_loop['last_switch'] or now)
+    _loop['last_switch'] = now
+    if ran < BLOCKING_THRESHOLD or type(origin).__name__ == 'Hub':
+        return
+    _loop['total_blocks'] += 1
+    _loop['max_seconds'] = max(_loop['max_seconds'], ran)
+    _loop['blocks'].append({
+        'at': time.time(),
+        'seconds': ran,
+        'greenlet': _describe(origin),
+        'stack': traceback.format_stack(sys._getframe(1), limit=BLOCKING_STACK_DEPTH)
+    })
+
+def _describe(glet):
+    return getattr(glet, 'name', None) or repr(glet)
+
+def dump_greenlets():
+    """
+    すべてのグリーンレットの状態とスタック、イベントループのブロックの記録を返す関数
+
+    gc の全オブジェクトを走査するため、管理用のエンドポイントからのみ呼び出す。
+    """
+    current = greenlet.getcurrent()
+    greenlets = []
+    for obj in gc.get_objects():
+        if not isinstance(obj, greenlet.greenlet):
+            continue
+        frame = sys._getframe() if obj is current else obj.gr_frame
+        greenlets.append({
+            'greenlet': _describe(obj),
+            'type': type(obj).__name__,
+            'state': 'running' if obj is current else ('dead' if obj.dead else ('suspended' if obj else 'not_started')),
+            'profiled': obj in _active,
+            'stack': traceback.format_stack(frame, limit=BLOCKING_STACK_DEPTH) if frame is not None else []
+        })
+    return {
+        'greenlets': greenlets,
+        'loop_monitor': {
+            'enabled': _settings['loop_monitor'],
+            'threshold_seconds': BLOCKING_THRESHOLD,
+            'total_blocks': _loop['total_blocks'],
+            'max_seconds': _loop['max_seconds'],
+            'recent_blocks': list(_loop['blocks'])
+        },
+        'active_profiles': [p.profile_id for p in list(_active.values())]
+    }
+
+def list_profiles():
+    """保存された計測結果の概要を新しい順に返す"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    summaries = []
+    for profile_id in os.listdir(PROFILE_DIR):
+        path = os.path.join(PROFILE_DIR, profile_id, 'summary.json')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                summaries.append(json.load(f))
+    return sorted(summaries, key=lambda s: s['started_at'], reverse=True)
+
+def profile_stage_path(profile_id, stage):
+    """ステージの折りたたみスタックのファイルパスを返す。存在しない場合は None"""
+    try:
+        uuid.UUID(profile_id)
+    except ValueError:
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id, f"{os.path.basename(stage)}.folded")
+    return path if os.path.exists(path) else None
@@ -0,0 +1,119 @@
+# services/prompt_registry.py
+
+"""
+議事録生成に使用するプロンプトを一元管理するモジュール
+
+プロンプトはバージョンごとに登録し、生成結果にはそのバージョンを記録する。
+各プロバイダのプロンプトキャッシュを有効に使えるよう、リクエストは
+すべてのリクエストで共通の静的なプレフィックス（指示）と、会議ごとに変わる
+リクエスト部分（文字起こし）に分けて構築する。
+"""
+
+import hashlib
+
+# プロンプトを分割して管理しやすくする
+SYSTEM_PROMPT = """プロの議事録作成者として、以下の会議内容から詳細かつ構造化された議事録を**日本語で**作成してください。"""
+
+INSTRUCTIONS = [
+    "1. 各議題項目とサブトピックについて、できるだけ詳細に記述してください。議論の内容、提案、提起された懸念事項を深く説明してください。",
+    "2. 専門用語や概念が言及された場合、簡単な説明や定義を追加してください。",
+    "3. プロジェクトやイニシアチブの進捗状況、現在の段階、次のステップについて、より具体的な情報を提供してください。",
+    "4. 重要な手順や方法論が議論された場合、各ステップを詳細に説明し、潜在的な問題点や注意事項を含めてください。",
+    "5. 目標や期限については、より具体的な詳細と、それらを達成するための具体的なアクションアイテムを提供してください。",
+    "6. 将来の計画や提案についてより詳細な説明を含め、それらが組織や目標にどのように貢献するかを分析してください。",
+    "7. チームの協力やコミュニケーションに関する具体的な方針や推奨事項がある場合、それらを詳細に記録してください。",
+    "8. 決定事項、アクションアイテム、期限が明確に定義されている場合、責任者や完了条件を含めてこれらを強調してください。",
+    "9. 議論された課題や問題点を詳細に記録し、提案された解決策も含めてください。",
+    "10. 次回の会議の準備事項や、会議間に完了すべきタスクを具体的に記載してください。",
+    "11. 財務事項が議論された場合、具体的な数字、予算配分、財務目標を正確に記録してください。",
+    "12. 法的または規制上の問題が議論された場合、その内容と潜在的な影響を慎重に文書化してください。",
+    "13. 新しいアイデアやイノベーションが議論された場合、その詳細と潜在的な影響を記録してください。",
+    "14. 参加者の役割や貢献が明確な場合、機密情報に注意しながら、名前を挙げて記録してください。",
+    "15. 議事録の最後に、重要なポイントの非常に詳細なサマリーを追加し、重要な決定事項とアクションアイテムを箇条書きで明確にリストアップしてください。"
+]
+
+FORMATTING_INSTRUCTIONS = """
+さらに、議事録をマークダウン形式で作成する際は、以下の点に注意してください：
+
+- 適切な見出しレベル（#, ##, ### など）を使用して、文書を明確に構造化してください。
+- リストには適切なマークダウン構文（- または 1. など）を使用してください。
+- 重要な部分は適切に強調してください（**太字** または *斜体* を使用）。
+- 必要に応じて適切な引用構文（>）を使用してください。
+- 必要に応じて水平線（---）を使用してセクションを区切ってください。
+
+議事録の冒頭には、基本的な会議情報（日付、時間、場所、参加者、議題など）を含めてください。
+"""
+
+REQUEST_TEMPLATE = "以下の会議内容に基づいて、上記の指示に従って包括的で詳細な議事録をマークダウン形式で作成してください。議事録は会議で使用された言語で作成してください。\n\n{text}"
+
+# 文字起こしの修正箇所に対応する議事録のセクションだけを書き直すためのプロンプト
+SECTION_SYSTEM_PROMPT = """プロの議事録作成者として、既存の議事録の1つのセクションを、修正された会議内容に基づいて**日本語で**書き直してください。"""
+
+SECTION_INSTRUCTIONS = [
+    "1. 出力は書き直したセクションのみとし、前置きや説明、コードブロックの記号を含めないでください。",
+    "2. セクションの見出し行（# の数と見出しの文言）は変更せず、そのまま先頭に出力してください。",
+    "3. 修正前と修正後の会議内容を比較し、人名、用語、数値、決定事項などの誤りを修正後の内容に合わせて訂正してください。",
+    "4. 修正に関係しない記述は、元の表現と構成をできるだけそのまま維持してください。"
+]
+
+SECTION_FORMATTING_INSTRUCTIONS = """
+元のセクションと同じマークダウンの書式（見出しレベル、箇条書き、強調）を使用してください。
+"""
+
+SECTION_REQUEST_TEMPLATE = "以下の「現在のセクション」を、「修正後の会議内容」に基づいて書き直してください。\n\n{text}"
+
+# 登録済みのプロンプト（バージョン -> 定義）
+PROMPTS = {
+    'minutes-v1': {
+        'system': SYSTEM_PROMPT,
+        'instructions': INSTRUCTIONS,
+        'formatting': FORMATTING_INSTRUCTIONS,
+        'request': REQUEST_TEMPLATE
+    },
+    'section-v1': {
+        'system': SECTION_SYSTEM_PROMPT,
+        'instructions': SECTION_INSTRUCTIONS,
+        'formatting': SECTION_FORMATTING_INSTRUCTIONS,
+        'request': SECTION_REQUEST_TEMPLATE
+    }
+}
+
+# 現在使用するプロンプトのバージョン
+PROMPT_VERSION = 'minutes-v1'
+
+# セクション単位の再生成に使用するプロンプトのバージョン
+SECTION_PROMPT_VERSION = 'section-v1'
+
+def get_prompt(version=None):
+    """指定されたバージョン（省略時は現在のバージョン）のプロンプト定義を返す"""
+    version = version or PROMPT_VERSION
+    if version not in PROMPTS:
+        raise KeyError(f"Unknown prompt version: {version}")
+    return PROMPTS[version]
+
+def build_static_prefix(version=None):
+    """
+    すべてのリクエストで共通の指示部分を構築する関数
+
+    この部分はリクエスト間でバイト単位で同一になるため、プロバイダのプロンプトキャッシュの対象になる。
+
+    Returns:
+        str: システムプロンプト、指示、書式の指示を結合したテキスト
+    """
+    prompt = get_prompt(version)
+    text = f"{prompt['system']}\n\n"
+    text += "\n".join(prompt['instructions']) + "\n\n"
+    text += prompt['formatting']
+    return text
+
+def build_request(text, version=None):
+    """会議内容を含む、リクエストごとに変わる部分を構築する関数"""
+    return get_prompt(version)['request'].format(text=text)
+
+def build_full_prompt(text, version=None):
+    """静的なプレフィックスとリクエストを1つのテキストに結合する関数（システム指示に対応しないモデル用）"""
+    return build_static_prefix(version) + "\n\n" + build_request(text, version)
+
+def prefix_fingerprint(version=None):
+    """静的なプレフィックスのハッシュ値を返す（キャッシュのキーやログに使用する）"""
+    return hashlib.sha256(build_static_prefix(version).encode('utf-8')).hexdigest()[:12]
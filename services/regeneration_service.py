@@ -0,0 +1,254 @@
+# services/regeneration_service.py
+
+import re
+import difflib
+import itertools
+import concurrent.futures
+from services.pipeline_service import generate_minutes_with_fallback
+from services.prompt_registry import SECTION_PROMPT_VERSION
+from services.deadline_service import check_deadline
+from logger import app_logger
+
+# 置換とみなす修正の最小・最大文字数（これより短い、または長い修正はセクションの書き直しで反映する）
+SUBSTITUTION_MIN_CHARS = 2
+SUBSTITUTION_MAX_CHARS = 20
+
+# 置換とみなす語の文字の種類（ひらがなは助詞や語尾として議事録のあらゆる箇所に現れるため対象外とする）
+SUBSTITUTION_CLASSES = ('kanji', 'katakana', 'alnum')
+
+# 修正箇所の前後に含める文の数
+CONTEXT_UNITS = 3
+
+# 修正箇所と議事録のセクションを対応付ける最小の一致率
+MIN_SECTION_SCORE = 0.05
+
+# 最も一致率の高いセクションに対して、この割合以上の一致率のセクションも対象にする
+RELATIVE_SECTION_SCORE = 0.6
+
+# この割合を超えるセクションが対象になった場合は議事録全体を再生成する
+MAX_SECTION_FRACTION = 0.5
+
+# どのセクションにも対応しない修正がこの文字数を超えた場合は議事録全体を再生成する
+MAX_UNMATCHED_CHARS = 200
+
+# 同時に再生成するセクションの数
+SECTION_WORKERS = 4
+
+def split_units(text):
+    """文字起こしを文単位（句点・空白区切り）に分割する"""
+    return re.findall(r'[^。！？!?\s]+[。！？!?]?', text)
+
+def _char_class(c):
+    if '一' <= c <= '鿿' or c in '々〆ヶ':
+        return 'kanji'
+    if '゠' <= c <= 'ヿ':
+        return 'katakana'
+    if '぀' <= c <= 'ゟ':
+        return 'hiragana'
+    if c.isalnum():
+        return 'alnum'
+    return None
+
+def _tokens(text):
+    """文を同じ種類の文字（漢字の連続など）ごとの語に分割する"""
+    return [''.join(chars) for _, chars in itertools.groupby(text, key=_char_class)]
+
+def _is_substitution_word(word):
+    return (SUBSTITUTION_MIN_CHARS <= len(word) <= SUBSTITUTION_MAX_CHARS
+            and all(_char_class(c) in SUBSTITUTION_CLASSES for c in word))
+
+def _occurs_only_as_word(text, word):
+    """word が text に含まれ、そのすべてが前後に同じ種類の文字が続かない語（会議室の「会議」などではない）の場合に True を返す"""
+    first, last = _char_class(word[0]), _char_class(word[-1])
+    position = text.find(word)
+    if position < 0:
+        return False
+    while position >= 0:
+        end = position + len(word)
+        if position > 0 and _char_class(text[position - 1]) == first:
+            return False
+        if end < len(text) and _char_class(text[end]) == last:
+            return False
+        position = text.find(word, end)
+    return True
+
+def diff_transcripts(old_text, new_text):
+    """
+    修正前と修正後の文字起こしを文単位で比較し、変更箇所のリストを返す関数
+
+    Returns:
+        list: {'old': 修正前の文, 'new': 修正後の文, 'old_context': 前後を含む修正前の文, 'new_context': 前後を含む修正後の文}
+    """
+    old_units, new_units = split_units(old_text), split_units(new_text)
+    matcher = difflib.SequenceMatcher(None, old_units, new_units, autojunk=False)
+    changes = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        changes.append({
+            'old': ' '.join(old_units[i1:i2]),
+            'new': ' '.join(new_units[j1:j2]),
+            'old_context': ' '.join(old_units[max(0, i1 - CONTEXT_UNITS):i2 + CONTEXT_UNITS]),
+            'new_context': ' '.join(new_units[max(0, j1 - CONTEXT_UNITS):j2 + CONTEXT_UNITS])
+        })
+    return changes
+
+def find_substitutions(changes, minutes, new_transcription):
+    """
+    すべての変更が議事録に現れる語の置き換え（人名の誤認識の修正など）の場合は (修正前, 修正後) のリストを返す
+
+    文を同じ種類の文字ごとの語に分割して比較し、漢字・カタカナ・英数字だけからなる2文字以上の語の
+    置き換えだけを対象にする。語の追加・削除、ひらがな（助詞や語尾）の修正、長い書き換えを含む場合は None を返す。
+    議事録内の語をすべて置き換えるため、修正後の文字起こしに修正前の語が残っている（一部の箇所だけを修正した）場合や、
+    議事録で修正前の語が独立した語として現れない（「定例会議」「会議室」の「会議」など）場合も None を返す。
+    """
+    substitutions = []
+    for change in changes:
+        a, b = _tokens(change['old']), _tokens(change['new'])
+        if not a or not b:
+            return None
+        matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                continue
+            old_word, new_word = ''.join(a[i1:i2]), ''.join(b[j1:j2])
+            if not _is_substitution_word(old_word) or not _is_substitution_word(new_word):
+                return None
+            if old_word in new_transcription or not _occurs_only_as_word(minutes, old_word):
+                return None
+            if (old_word, new_word) not in substitutions:
+                substitutions.append((old_word, new_word))
+    return substitutions
+
+def split_sections(minutes):
+    """
+    議事録を見出しごとのセクションに分割する関数
+
+    各セクションは見出し行を含む元のテキストのままで、すべてを連結すると元の議事録に戻る。
+
+    Returns:
+        list: {'heading': 見出し行（冒頭の見出しのない部分は ''）, 'text': セクションのテキスト}
+    """
+    sections = []
+    for line in minutes.splitlines(keepends=True):
+        if re.match(r'^#{1,6}\s', line) or not sections:
+            sections.append({'heading': line.strip() if line.startswith('#') else '', 'text': line})
+        else:
+            sections[-1]['text'] += line
+    return sections
+
+def _trigrams(text):
+    text = re.sub(r'\s+', '', text)
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def map_changes_to_sections(changes, sections):
+    """
+    変更箇所を、内容（3文字単位の一致率）が重なる議事録のセクションに対応付ける関数
+
+    Returns:
+        tuple: ({セクション番号: [変更箇所, ...]}, どのセクションにも対応しなかった変更の文字数)
+    """
+    section_grams = [_trigrams(section['text']) for section in sections]
+    affected = {}
+    unmatched_chars = 0
+    for change in changes:
+        grams = _trigrams(change['old']) | _trigrams(change['new'])
+        if not grams:
+            continue
+        scores = [len(grams & s) / len(grams) for s in section_grams]
+        best = max(scores) if scores else 0
+        if best < MIN_SECTION_SCORE:
+            unmatched_chars += len(change['new'])
+            continue
+        for index, score in enumerate(scores):
+            if score >= max(MIN_SECTION_SCORE, best * RELATIVE_SECTION_SCORE):
+                affected.setdefault(index, []).append(change)
+    return affected, unmatched_chars
+
+def _build_section_request(section, changes):
+    old_excerpt = '\n'.join(f"- {change['old_context']}" for change in changes)
+    new_excerpt = '\n'.join(f"- {change['new_context']}" for change in changes)
+    return (
+        f"### 現在のセクション\n\n{section['text'].strip()}\n\n"
+        f"### 修正前の会議内容（該当箇所）\n\n{old_excerpt}\n\n"
+        f"### 修正後の会議内容（該当箇所）\n\n{new_excerpt}"
+    )
+
+def _clean_section(generated, section):
+    """生成されたセクションからコードブロックの記号を取り除き、見出しと末尾の改行を元のセクションに揃える"""
+    text = re.sub(r'^```(?:markdown)?\s*\n|\n```\s*$', '', generated.strip()).strip()
+    if section['heading'] and not text.startswith('#'):
+        text = section['heading'] + '\n' + text
+    trailing = section['text'][len(section['text'].rstrip('\n')):]
+    return text + (trailing or '\n')
+
+def regenerate_incremental(minutes, source_transcription, new_transcription, notify=None, deadline=None):
+    """
+    修正された文字起こしに合わせて、議事録の影響を受けた部分だけを更新する関数
+
+    1. 変更がなければ議事録をそのまま返す
+    2. すべての変更が漢字・カタカナ・英数字の語の置き換えで、その語を議事録内で安全に置き換えられる場合は
+       議事録内の同じ語を置き換える（APIを呼び出さない。条件は find_substitutions を参照）
+    3. 変更箇所に対応するセクションだけを並列に再生成し、元の議事録に差し込む
+    4. 対応するセクションが多すぎる、または特定できない場合は議事録全体を再生成する
+
+    Args:
+        minutes (str): 現在の議事録
+        source_transcription (str): 現在の議事録の生成に使用した文字起こし
+        new_transcription (str): 修正後の文字起こし
+        notify (callable): 進捗通知用のコールバック notify(event, data)
+        deadline (Deadline): ジョブの期限
+
+    Returns:
+        dict: minutes, mode（unchanged, substitution, sections, full）, sections（再生成した見出し）, api_name, prompt_version
+    """
+    notify = notify or (lambda event, data: None)
+    changes = diff_transcripts(source_transcription, new_transcription)
+    if not changes:
+        return {'minutes': minutes, 'mode': 'unchanged', 'sections': [], 'api_name': None, 'prompt_version': None}
+
+    substitutions = find_substitutions(changes, minutes, new_transcription)
+    if substitutions is not None:
+        updated = minutes
+        for old_word, new_word in substitutions:
+            updated = updated.replace(old_word, new_word)
+        app_logger.info(f"Applied {len(substitutions)} substitutions to minutes without regeneration: {substitutions}")
+        return {'minutes': updated, 'mode': 'substitution', 'sections': [], 'api_name': None, 'prompt_version': None}
+
+    sections = split_sections(minutes)
+    affected, unmatched_chars = map_changes_to_sections(changes, sections)
+    if (not affected or len(affected) > len(sections) * MAX_SECTION_FRACTION
+            or unmatched_chars > MAX_UNMATCHED_CHARS):
+        app_logger.info(f"Falling back to full regeneration: {len(affected)}/{len(sections)} sections affected, "
+                        f"{unmatched_chars} unmatched chars")
+        new_minutes, api_name, prompt_version = generate_minutes_with_fallback(new_transcription, notify, deadline)
+        return {'minutes': new_minutes, 'mode': 'full', 'sections': [], 'api_name': api_name, 'prompt_version': prompt_version}
+
+    app_logger.info(f"Regenerating {len(affected)}/{len(sections)} sections for {len(changes)} transcript changes")
+    notify('status_update', {'status': f'{len(affected)} 個のセクションを再生成中...'})
+
+    def regenerate_section(index):
+        check_deadline(deadline)
+        request_text = _build_section_request(sections[index], affected[index])
+        return generate_minutes_with_fallback(request_text, notify, deadline,
+                                              prompt_version=SECTION_PROMPT_VERSION, compact=False)
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(SECTION_WORKERS, len(affected))) as executor:
+        futures = {executor.submit(regenerate_section, index): index for index in affected}
+        for future in concurrent.futures.as_completed(futures):
+            results[futures[future]] = future.result()
+
+    api_names = []
+    for index, (section_text, api_name, _) in results.items():
+        sections[index]['text'] = _clean_section(section_text, sections[index])
+        if api_name not in api_names:
+            api_names.append(api_name)
+
+    return {
+        'minutes': ''.join(section['text'] for section in sections),
+        'mode': 'sections',
+        'sections': [sections[index]['heading'] for index in sorted(results)],
+        'api_name': ', '.join(api_names),
+        'prompt_version': SECTION_PROMPT_VERSION
+    }
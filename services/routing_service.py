@@ -0,0 +1,107 @@
+# services/routing_service.py
+
+import os
+import json
+from services.minutes_service import generate_minutes
+from services.openai_miniutes_service import openai_generate_minutes
+from services.gemni_miniutes_service import gemini_generate_minutes
+from services.compaction_service import estimate_tokens
+from services.sdk_loader import is_configured
+from logger import app_logger
+
+# プロバイダ名 -> (議事録生成関数, 表示用のAPI名)
+PROVIDERS = {
+    'gemini': (gemini_generate_minutes, "Gemini API"),
+    'openai': (openai_generate_minutes, "ChatGPT API"),
+    'claude': (generate_minutes, "Claude API")
+}
+
+# 各モデルのコンテキスト長（トークン数）
+MODEL_CONTEXT_LIMITS = {
+    'gemini-pro': 30720,
+    'gemini-1.5-flash': 1048576,
+    'gemini-1.5-pro': 2097152,
+    'gpt-4': 8192,
+    'gpt-4o': 128000,
+    'gpt-4o-mini': 128000,
+    'claude-3-haiku-20240307': 200000,
+    'claude-3-5-sonnet-20240620': 200000
+}
+
+# プロンプトの指示と出力のために確保するトークン数
+RESERVED_TOKENS = 6000
+
+# 文字起こしのトークン数に応じたモデルの階層（上から順に max_tokens 以下の最初の階層を使用する）
+# MINUTES_ROUTING_TIERS 環境変数に同じ形式のJSONを指定すると上書きできる
+DEFAULT_ROUTING_TIERS = [
+    {
+        'name': 'short',
+        'max_tokens': int(os.environ.get('ROUTING_SHORT_MAX_TOKENS', 8000)),
+        'routes': [['gemini', 'gemini-1.5-flash'], ['openai', 'gpt-4o-mini'], ['claude', 'claude-3-haiku-20240307']]
+    },
+    {
+        'name': 'standard',
+        'max_tokens': int(os.environ.get('ROUTING_STANDARD_MAX_TOKENS', 60000)),
+        'routes': [['gemini', 'gemini-1.5-flash'], ['openai', 'gpt-4o'], ['claude', 'claude-3-5-sonnet-20240620']]
+    },
+    {
+        'name': 'long',
+        'max_tokens': None,
+        'routes': [['gemini', 'gemini-1.5-pro'], ['claude', 'claude-3-5-sonnet-20240620'], ['openai', 'gpt-4o']]
+    }
+]
+
+def load_routing_tiers():
+    """環境変数または既定値からモデルの階層設定を読み込む"""
+    override = os.environ.get('MINUTES_ROUTING_TIERS')
+    if override:
+        try:
+            return json.loads(override)
+        except ValueError as e:
+            app_logger.error(f"Invalid MINUTES_ROUTING_TIERS, using defaults: {str(e)}")
+    return DEFAULT_ROUTING_TIERS
+
+ROUTING_TIERS = load_routing_tiers()
+
+def count_tokens(text):
+    """文字起こしのトークン数をローカルで数える（APIは呼び出さない）"""
+    return estimate_tokens(text)
+
+def select_routes(text):
+    """
+    文字起こしの長さに応じて議事録生成に使用するプロバイダとモデルを選択する関数
+
+    トークン数が max_tokens 以下の最初の階層を選び、その階層のモデルのうち
+    APIキーが設定されていないプロバイダと、コンテキスト長に収まらないものを除外する。
+
+    Args:
+        text (str): 議事録生成に使用する文字起こし
+
+    Returns:
+        tuple: (階層名, トークン数, [(議事録生成関数, API名, モデル名), ...])
+    """
+    tokens = count_tokens(text)
+    tier = ROUTING_TIERS[-1]
+    for candidate in ROUTING_TIERS:
+        if candidate['max_tokens'] is None or tokens <= candidate['max_tokens']:
+            tier = candidate
+            break
+
+    routes = []
+    for provider, model in tier['routes']:
+        if provider not in PROVIDERS:
+            app_logger.warning(f"Unknown provider in routing tier {tier['name']}: {provider}")
+            continue
+        if not is_configured(provider):
+            # APIキーが設定されていないプロバイダは試行せず、SDKも読み込まない
+            continue
+        limit = MODEL_CONTEXT_LIMITS.get(model)
+        if limit is not None and tokens + RESERVED_TOKENS > limit:
+            app_logger.info(f"Skipping {model}: {tokens} tokens exceed its context window")
+            continue
+        generate_func, api_name = PROVIDERS[provider]
+        routes.append((generate_func, api_name, model))
+
+    app_logger.info(f"Routing transcript of {tokens} tokens to tier '{tier['name']}': "
+                    f"{[model for _, _, model in routes]}")
+    return tier['name'], tokens, routes
@@ -0,0 +1,94 @@
+# services/sdk_loader.py
+
+import os
+import sys
+import time
+import importlib
+import threading
+import psutil
+from logger import app_logger
+
+# プロバイダ名 -> (SDKのモジュール名, APIキーの環境変数名)
+PROVIDER_SDKS = {
+    'gemini': ('google.generativeai', 'GOOGLE_API_KEY'),
+    'openai': ('openai', 'OPENAI_API_KEY'),
+    'claude': ('anthropic', 'ANTHROPIC_API_KEY')
+}
+
+# プロバイダ名 -> {'module': 読み込んだモジュール, 'import_seconds': 読み込み時間, 'rss_delta_mb': メモリ増加量}
+_loaded = {}
+_lock = threading.Lock()
+
+# 起動時の計測結果
+_boot_report = {}
+
+def is_configured(provider):
+    """プロバイダのAPIキーが設定されているかどうかを返す"""
+    _, env_name = PROVIDER_SDKS[provider]
+    return bool(os.environ.get(env_name))
+
+def load_sdk(provider):
+    """
+    プロバイダのSDKを初回使用時に読み込んで返す関数
+
+    SDKの読み込みは重いため、起動時ではなく実際に議事録生成で使用するときに読み込む。
+    読み込みにかかった時間とメモリ増加量は get_import_report で確認できる。
+
+    Args:
+        provider (str): プロバイダ名（gemini, openai, claude）
+
+    Returns:
+        module: SDKのモジュール
+    """
+    loaded = _loaded.get(provider)
+    if loaded is not None:
+        return loaded['module']
+
+    module_name, _ = PROVIDER_SDKS[provider]
+    with _lock:
+        loaded = _loaded.get(provider)
+        if loaded is not None:
+            return loaded['module']
+
+        process = psutil.Process(os.getpid())
+        start_rss = process.memory_info().rss
+        start_time = time.perf_counter()
+        module = importlib.import_module(module_name)
+        import_seconds = time.perf_counter() - start_time
+        rss_delta_mb = (process.memory_info().rss - start_rss) / 1024 / 1024
+
+        _loaded[provider] = {
+            'module': module,
+            'import_seconds': import_seconds,
+            'rss_delta_mb': rss_delta_mb
+        }
+        app_logger.info(f"Loaded {module_name} for {provider} in {import_seconds:.3f}s (+{rss_delta_mb:.1f}MB)")
+        return module
+
+def record_boot(boot_seconds):
+    """アプリケーションの起動にかかった時間とメモリ使用量を記録する"""
+    process = psutil.Process(os.getpid())
+    _boot_report.update({
+        'boot_seconds': boot_seconds,
+        'rss_mb': process.memory_info().rss / 1024 / 1024,
+        'modules_loaded': len(sys.modules)
+    })
+    app_logger.info(f"App booted in {boot_seconds:.3f}s, RSS {_boot_report['rss_mb']:.1f}MB, "
+                    f"{_boot_report['modules_loaded']} modules loaded")
+
+def get_import_report():
+    """起動時間と各プロバイダSDKの読み込み状況をまとめて返す"""
+    providers = {}
+    for provider, (module_name, _) in PROVIDER_SDKS.items():
+        loaded = _loaded.get(provider)
+        providers[provider] = {
+            'module': module_name,
+            'configured': is_configured(provider),
+            'loaded': loaded is not None,
+            'import_seconds': loaded['import_seconds'] if loaded else None,
+            'rss_delta_mb': loaded['rss_delta_mb'] if loaded else None
+        }
+    return {
+        'boot': dict(_boot_report),
+        'providers': providers
+    }
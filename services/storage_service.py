@@ -0,0 +1,231 @@
+# services/storage_service.py
+
+import os
+import shutil
+import threading
+from logger import app_logger
+
+# 保存先のバックエンド（local: ローカルディスク, s3: S3互換のオブジェクトストレージ）
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+
+# ローカルの作業フォルダ。local バックエンドでは保存先、s3 バックエンドではダウンロードしたファイルのキャッシュとして使用する
+STORAGE_ROOT = os.environ.get('STORAGE_ROOT', 'uploads')
+
+# S3互換ストレージの設定（MinIO などを使用する場合は S3_ENDPOINT_URL を指定する）
+S3_BUCKET = os.environ.get('S3_BUCKET', 'aiscriber')
+S3_PREFIX = os.environ.get('S3_PREFIX', '')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+S3_REGION = os.environ.get('S3_REGION', 'us-east-1')
+
+# この大きさ（バイト）を超えるファイルはマルチパートで転送する
+S3_MULTIPART_THRESHOLD = int(os.environ.get('S3_MULTIPART_THRESHOLD', 16 * 1024 * 1024))
+S3_MULTIPART_CHUNKSIZE = int(os.environ.get('S3_MULTIPART_CHUNKSIZE', 16 * 1024 * 1024))
+S3_MAX_CONCURRENCY = int(os.environ.get('S3_MAX_CONCURRENCY', 8))
+
+class StorageError(Exception):
+    """保存先のファイルが存在しない、またはバックエンドを利用できない場合に発生する例外"""
+
+def _normalize_key(key):
+    key = key.replace(os.sep, '/').lstrip('/')
+    if not key or any(part in ('', '.', '..') for part in key.split('/')):
+        raise StorageError(f"Invalid storage key: {key!r}")
+    return key
+
+class LocalStorage:
+    """
+    ローカルディスクに保存するバックエンド
+
+    キーは STORAGE_ROOT からの相対パスで、ファイルは既に作業フォルダにあるためコピーは発生しない。
+    """
+
+    name = 'local'
+
+    def __init__(self, root):
+        self.root = root
+
+    def local_path(self, key):
+        """キーに対応する作業フォルダ内のパスを返す"""
+        return os.path.join(self.root, *_normalize_key(key).split('/'))
+
+    def key_for(self, path):
+        """作業フォルダ内のパスに対応するキーを返す"""
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root))
+        return _normalize_key(relative)
+
+    def publish(self, path, key=None):
+        """
+        作業フォルダのファイルを保存先に登録し、キーを返す
+
+        key を省略した場合は作業フォルダからの相対パスをキーとする。
+        """
+        key = _normalize_key(key) if key else self.key_for(path)
+        destination = self.local_path(key)
+        if os.path.abspath(destination) != os.path.abspath(path):
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.copyfile(path, destination)
+        return key
+
+    def fetch(self, key):
+        """キーのファイルを作業フォルダに用意し、そのパスを返す"""
+        path = self.local_path(key)
+        if not os.path.exists(path):
+            raise StorageError(f"Object not found: {key}")
+        return path
+
+    def open(self, key):
+        """キーのファイルをストリームとして読み込む"""
+        return open(self.fetch(key), 'rb')
+
+    def read_bytes(self, key):
+        """キーのファイルの内容を返す。存在しない場合は None"""
+        path = self.local_path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def write_bytes(self, key, data):
+        """一時ファイルに書き込んでから置き換え、書き込み途中の内容を読まれないようにする"""
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+class S3Storage:
+    """
+    S3互換のオブジェクトストレージに保存するバックエンド
+
+    ffmpeg や音声認識はローカルのファイルを必要とするため、fetch でオブジェクトを作業フォルダに
+    ダウンロードしてから処理する。どのノードでも同じキーから同じパスにファイルを用意できるため、
+    ジョブの各ステージを別のノードで実行できる。大きなファイルはマルチパートで並列に転送する。
+    """
+
+    name = 's3'
+
+    def __init__(self, root, bucket, prefix='', endpoint_url=None, region=None):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise StorageError("boto3 がインストールされていません")
+
+        self.root = root
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self._client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+        self._client_error = ClientError
+        self._transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=S3_MAX_CONCURRENCY
+        )
+        self._local = LocalStorage(root)
+        self._ensure_bucket()
+
+    def _ensure_bucket(self):
+        try:
+            self._client.head_bucket(Bucket=self.bucket)
+        except self._client_error:
+            app_logger.info(f"Creating bucket: {self.bucket}")
+            self._client.create_bucket(Bucket=self.bucket)
+
+    def _object_key(self, key):
+        return self.prefix + _normalize_key(key)
+
+    def _is_not_found(self, error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def local_path(self, key):
+        return self._local.local_path(key)
+
+    def key_for(self, path):
+        return self._local.key_for(path)
+
+    def publish(self, path, key=None):
+        key = _normalize_key(key) if key else self.key_for(path)
+        self._client.upload_file(path, self.bucket, self._object_key(key), Config=self._transfer_config)
+        app_logger.info(f"Uploaded {path} to s3://{self.bucket}/{self._object_key(key)}")
+        return key
+
+    def fetch(self, key):
+        path = self.local_path(key)
+        try:
+            head = self._client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self._client_error as e:
+            if self._is_not_found(e):
+                raise StorageError(f"Object not found: {key}")
+            raise
+        # 同じ大きさのファイルが既にある場合はダウンロード済みとみなす
+        if os.path.exists(path) and os.path.getsize(path) == head['ContentLength']:
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._client.download_file(self.bucket, self._object_key(key), tmp_path, Config=self._transfer_config)
+        os.replace(tmp_path, path)
+        app_logger.info(f"Downloaded s3://{self.bucket}/{self._object_key(key)} to {path}")
+        return path
+
+    def open(self, key):
+        try:
+            response = self._client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self._client_error as e:
+            if self._is_not_found(e):
+                raise StorageError(f"Object not found: {key}")
+            raise
+        return response['Body']
+
+    def read_bytes(self, key):
+        try:
+            response = self._client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self._client_error as e:
+            if self._is_not_found(e):
+                return None
+            raise
+        return response['Body'].read()
+
+    def write_bytes(self, key, data):
+        self._client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data)
+
+    def exists(self, key):
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except self._client_error as e:
+            if self._is_not_found(e):
+                return False
+            raise
+
+    def delete(self, key):
+        self._client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        self._local.delete(key)
+
+_storage = None
+_lock = threading.Lock()
+
+def get_storage():
+    """設定されたバックエンドのストレージを返す（初回呼び出し時に作成する）"""
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                if STORAGE_BACKEND == 's3':
+                    _storage = S3Storage(STORAGE_ROOT, S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION)
+                elif STORAGE_BACKEND == 'local':
+                    _storage = LocalStorage(STORAGE_ROOT)
+                else:
+                    raise StorageError(f"Unknown storage backend: {STORAGE_BACKEND}")
+                app_logger.info(f"Using {_storage.name} storage backend")
+    return _storage
@@ -0,0 +1,208 @@
+# services/transcript_store.py
+
+import re
+import json
+import time
+import uuid
+import threading
+from services.transcription_service import (
+    transcribe_segments, join_segments, wav_duration_ms, FAILED_STATUSES, SEGMENT_OK, SEGMENT_EMPTY
+)
+from services.storage_service import get_storage
+from logger import app_logger
+
+# 文字起こしのセグメント索引を保存するストレージ上のフォルダ
+TRANSCRIPT_PREFIX = '_transcripts'
+
+# 議事録と、その生成元の文字起こしを保存するストレージ上のフォルダ
+MINUTES_PREFIX = '_minutes'
+
+# 索引ファイルの形式のバージョン
+INDEX_VERSION = 1
+
+_TRANSCRIPT_ID_PATTERN = re.compile(r'^[0-9a-f-]{36}$')
+
+# 索引ファイルの更新は同じプロセス内で直列化する
+_lock = threading.Lock()
+
+def _index_key(transcript_id):
+    if not _TRANSCRIPT_ID_PATTERN.match(transcript_id or ''):
+        return None
+    return f"{TRANSCRIPT_PREFIX}/{transcript_id}.json"
+
+def _pack(segments):
+    """セグメントを [開始, 終了, 状態, テキスト] の配列に変換する（索引ファイルを小さく保つため）"""
+    return [[s['start'], s['end'], s['status'], s['text']] for s in segments]
+
+def _unpack(rows):
+    return [
+        {'index': i, 'start': start, 'end': end, 'status': status, 'text': text}
+        for i, (start, end, status, text) in enumerate(rows)
+    ]
+
+def _write(record):
+    data = dict(record, segments=_pack(record['segments']))
+    encoded = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    get_storage().write_bytes(_index_key(record['transcript_id']), encoded)
+
+def save_transcript(segments, audio_key, **metadata):
+    """
+    文字起こしのセグメント索引を保存する関数
+
+    Args:
+        segments (list): transcribe_segments が返すセグメントのリスト
+        audio_key (str): 再認識に使用するWAVファイルのストレージ上のキー
+        **metadata: 索引と一緒に保存する情報（filename, session_id など）
+
+    Returns:
+        str: 文字起こしのID
+    """
+    now = time.time()
+    record = {
+        'version': INDEX_VERSION,
+        'transcript_id': str(uuid.uuid4()),
+        'created_at': now,
+        'updated_at': now,
+        'audio_key': audio_key,
+        'metadata': metadata,
+        'segments': segments
+    }
+    _write(record)
+    app_logger.info(f"Transcript {record['transcript_id']} saved with {len(segments)} segments")
+    return record['transcript_id']
+
+def load_transcript(transcript_id):
+    """
+    保存された文字起こしを読み込む関数
+
+    Returns:
+        dict: transcript_id, audio_key, metadata, segments などを含む文字起こし。見つからない場合は None
+    """
+    key = _index_key(transcript_id)
+    data = get_storage().read_bytes(key) if key else None
+    if data is None:
+        return None
+    record = json.loads(data.decode('utf-8'))
+    record['segments'] = _unpack(record['segments'])
+    return record
+
+def transcript_text(record):
+    """文字起こし全体のテキストを返す"""
+    return join_segments(record['segments'])
+
+def update_segment_texts(transcript_id, texts):
+    """
+    利用者が修正したセグメントのテキストを索引に保存する関数
+
+    Args:
+        transcript_id (str): 文字起こしのID
+        texts (dict): セグメント番号 -> 修正後のテキスト
+
+    Returns:
+        dict: 更新後の文字起こし。見つからない場合は None
+
+    Raises:
+        ValueError: 存在しないセグメント番号が含まれる場合
+    """
+    with _lock:
+        record = load_transcript(transcript_id)
+        if record is None:
+            return None
+        updates = {}
+        for index, text in texts.items():
+            index = int(index)
+            if not 0 <= index < len(record['segments']) or not isinstance(text, str):
+                raise ValueError(f"Invalid segment: {index}")
+            updates[index] = text.strip()
+        if not updates:
+            return record
+        for index, text in updates.items():
+            record['segments'][index].update(text=text, status=SEGMENT_OK if text else SEGMENT_EMPTY)
+        record['updated_at'] = time.time()
+        _write(record)
+    app_logger.info(f"Transcript {transcript_id} updated with {len(updates)} edited segments")
+    return record
+
+def failed_segment_indexes(segments):
+    """認識に失敗した（エラーまたは未処理の）セグメントの番号を返す"""
+    return [s['index'] for s in segments if s['status'] in FAILED_STATUSES]
+
+def segment_indexes_for_range(segments, start_ms, end_ms):
+    """指定した時間範囲（ミリ秒）と重なるセグメントの番号を返す"""
+    return [s['index'] for s in segments if s['start'] < end_ms and s['end'] > start_ms]
+
+def retranscribe(transcript_id, indexes, progress_callback=None, deadline=None):
+    """
+    指定したセグメントだけを再認識し、索引を更新する関数
+
+    他のセグメントの結果はそのまま残すため、長い会議の一部分だけを短時間で修正できる。
+
+    Args:
+        transcript_id (str): 文字起こしのID
+        indexes (list): 再認識するセグメントの番号
+        progress_callback (callable): 進捗（%）を受け取るコールバック
+        deadline (Deadline): ジョブの期限
+
+    Returns:
+        tuple: (更新後の文字起こし, 再認識したセグメントのリスト)。文字起こしが見つからない場合は (None, [])
+
+    Raises:
+        StorageError: 再認識に必要な音声ファイルが削除されている場合
+    """
+    record = load_transcript(transcript_id)
+    if record is None:
+        return None, []
+    # 別のノードで作成された文字起こしの場合は音声をストレージから取得する
+    audio_file = get_storage().fetch(record['audio_key'])
+
+    duration = wav_duration_ms(audio_file)
+    targets = sorted(set(indexes))
+    segment_infos = []
+    for index in targets:
+        segment = record['segments'][index]
+        start, end = segment['start'], min(segment['end'], duration)
+        segment_infos.append((index, start, max(0, end - start)))
+
+    app_logger.info(f"Re-transcribing {len(segment_infos)} segments of transcript {transcript_id}")
+    updated = transcribe_segments(audio_file, progress_callback or (lambda progress: None),
+                                  deadline, segment_infos)
+
+    # 認識中に他のリクエストが更新している可能性があるため、最新の索引に対して差分を適用する
+    with _lock:
+        record = load_transcript(transcript_id)
+        for segment in updated:
+            record['segments'][segment['index']].update(text=segment['text'], status=segment['status'])
+        record['updated_at'] = time.time()
+        _write(record)
+
+    return record, [record['segments'][s['index']] for s in updated]
+
+def _minutes_key(transcript_id):
+    if not _TRANSCRIPT_ID_PATTERN.match(transcript_id or ''):
+        return None
+    return f"{MINUTES_PREFIX}/{transcript_id}.json"
+
+def save_minutes(transcript_id, minutes, source_transcription, api_name=None, prompt_version=None):
+    """
+    議事録と、その生成に使用した文字起こしを保存する関数
+
+    文字起こしが修正された場合に、どの部分が変わったかを比較するために使用する。
+    """
+    key = _minutes_key(transcript_id)
+    if key is None:
+        return
+    record = {
+        'transcript_id': transcript_id,
+        'updated_at': time.time(),
+        'minutes': minutes,
+        'source_transcription': source_transcription,
+        'api_name': api_name,
+        'prompt_version': prompt_version
+    }
+    get_storage().write_bytes(key, json.dumps(record, ensure_ascii=False).encode('utf-8'))
+
+def load_minutes(transcript_id):
+    """保存された議事録と生成元の文字起こしを返す。見つからない場合は None"""
+    key = _minutes_key(transcript_id)
+    data = get_storage().read_bytes(key) if key else None
+    return json.loads(data.decode('utf-8')) if data is not None else None
@@ -6,34 +6,63 @@ from functools import partial
 import logging
 import psutil
 import time
+import wave
+from services.deadline_service import check_deadline, timeout_for
 
 logger = logging.getLogger(__name__)
 
+# 1セグメントの認識リクエストの最大時間（秒）
+SEGMENT_REQUEST_TIMEOUT = 60
+
+# 認識に失敗したセグメントに挿入するエラーメッセージ（後段で取り除けるよう括弧で囲む）
+ERROR_PLACEHOLDER = "【音声認識サービスでエラーが発生しました: {error}】"
+
+# 1セグメントの長さ（ミリ秒）
+SEGMENT_DURATION_MS = 60000
+
+# セグメントの認識結果の状態
+SEGMENT_OK = 'ok'            # 認識に成功した
+SEGMENT_EMPTY = 'empty'      # 音声を認識できなかった（無音など）
+SEGMENT_ERROR = 'error'      # 音声認識サービスでエラーが発生した
+SEGMENT_SKIPPED = 'skipped'  # 期限切れやキャンセルにより認識しなかった
+
+# 再認識の対象とする状態
+FAILED_STATUSES = {SEGMENT_ERROR, SEGMENT_SKIPPED}
+
 def get_memory_usage():
     process = psutil.Process(os.getpid())
     return process.memory_info().rss / 1024 / 1024
 
-def transcribe_segment(segment_info, recognizer, progress_callback, total_segments, processed_segments, audio_file):
+def transcribe_segment(segment_info, recognizer, progress_callback, total_segments, processed_segments, audio_file, deadline=None):
+    """
+    1つのセグメントを文字起こしする関数
+
+    Returns:
+        tuple: (セグメント番号, テキスト, 状態)
+    """
     index, start_time, duration = segment_info
     logger.debug(f"開始: セグメント {index} の処理")
     start_process_time = time.time()
     start_memory = get_memory_usage()
 
     try:
-        audio = AudioSegment.from_wav(audio_file)[start_time:start_time+duration]
-        audio_data = audio.raw_data
-        sample_rate = audio.frame_rate
+        # 期限切れやキャンセル後は残りのセグメントを認識せずに空として扱う
+        if deadline is not None and deadline.done():
+            logger.warning(f"セグメント {index} をスキップしました: 処理が打ち切られました")
+            return index, "", SEGMENT_SKIPPED
+
+        audio = read_wav_range(audio_file, start_time, duration)
         
         logger.debug(f"Google Speech Recognitionを使用した文字起こし: セグメント {index}")
-        text = recognizer.recognize_google(audio_data, sample_rate=sample_rate, language="ja-JP")
+        text = recognize_google(recognizer, audio, deadline)
         logger.info(f"セグメント {index} の文字起こしが成功しました")
-        return index, text
+        return index, text, SEGMENT_OK
     except sr.UnknownValueError:
         logger.warning(f"セグメント {index} の文字起こしに失敗しました: 音声を認識できませんでした")
-        return index, ""
+        return index, "", SEGMENT_EMPTY
     except sr.RequestError as e:
         logger.error(f"セグメント {index} の文字起こし中にエラーが発生しました: {str(e)}")
-        return index, f"音声認識サービスでエラーが発生しました: {str(e)}"
+        return index, ERROR_PLACEHOLDER.format(error=str(e)), SEGMENT_ERROR
     finally:
         processed_segments.append(1)
         progress = (len(processed_segments) / total_segments) * 100
@@ -43,7 +72,65 @@ def transcribe_segment(segment_info, recognizer, progress_callback, total_segmen
         logger.debug(f"終了: セグメント {index} の処理. 処理時間: {end_process_time - start_process_time:.2f}秒, "
                      f"メモリ使用量変化: {end_memory - start_memory:.2f}MB")
 
-def transcribe_audio(audio_file, progress_callback):
+def read_wav_range(audio_file, start_ms, duration_ms):
+    """
+    WAVファイルの指定した範囲だけを読み込む関数
+
+    ファイル全体をデコードせずにシークして読み込むため、長い音声の一部を再認識する場合も高速に動作する。
+
+    Args:
+        audio_file (str): WAVファイルのパス
+        start_ms (int): 開始位置（ミリ秒）
+        duration_ms (int): 長さ（ミリ秒）
+
+    Returns:
+        AudioSegment: 指定した範囲の音声
+    """
+    with wave.open(audio_file, 'rb') as wav:
+        frame_rate = wav.getframerate()
+        start_frame = min(wav.getnframes(), int(start_ms * frame_rate / 1000))
+        wav.setpos(start_frame)
+        raw = wav.readframes(int(duration_ms * frame_rate / 1000))
+        return AudioSegment(data=raw, sample_width=wav.getsampwidth(),
+                            frame_rate=frame_rate, channels=wav.getnchannels())
+
+def wav_duration_ms(audio_file):
+    """WAVファイルの長さ（ミリ秒）をヘッダーから取得する"""
+    with wave.open(audio_file, 'rb') as wav:
+        return wav.getnframes() * 1000 // wav.getframerate()
+
+def recognize_google(recognizer, audio, deadline=None):
+    """
+    pydub の AudioSegment を Google Speech Recognition で文字起こしする関数
+
+    ジョブの残り時間をリクエストのタイムアウトとして使用する。
+    """
+    audio_data = sr.AudioData(audio.raw_data, audio.frame_rate, audio.sample_width)
+    recognizer.operation_timeout = timeout_for(deadline, SEGMENT_REQUEST_TIMEOUT)
+    return recognizer.recognize_google(audio_data, language="ja-JP")
+
+def plan_segments(total_duration, segment_duration=SEGMENT_DURATION_MS):
+    """音声の長さから (セグメント番号, 開始位置, 長さ) のリストを作成する（単位はミリ秒）"""
+    total_segments = (total_duration + segment_duration - 1) // segment_duration
+    return [(i, i*segment_duration, min(segment_duration, total_duration-i*segment_duration))
+            for i in range(total_segments)]
+
+def transcribe_segments(audio_file, progress_callback, deadline=None, segment_infos=None):
+    """
+    音声ファイルをセグメントごとに並列に文字起こしし、タイムスタンプ付きのセグメント一覧を返す関数
+
+    deadline の期限を過ぎた場合は残りのセグメントを skipped として扱い、認識できた部分だけを返す。
+    キャンセルされた場合は JobCancelledError を送出する。
+
+    Args:
+        audio_file (str): WAVファイルのパス
+        progress_callback (callable): 進捗（%）を受け取るコールバック
+        deadline (Deadline): ジョブの期限
+        segment_infos (list): 認識する (セグメント番号, 開始位置, 長さ) のリスト。省略時は音声全体を60秒ごとに分割する
+
+    Returns:
+        list: セグメント番号順の {'index', 'start', 'end', 'text', 'status'} のリスト（start / end はミリ秒）
+    """
     logger.info(f"音声ファイル {audio_file} の文字起こしを開始します")
     start_time = time.time()
     start_memory = get_memory_usage()
@@ -55,10 +142,11 @@ def transcribe_audio(audio_file, progress_callback):
         file_size = os.path.getsize(audio_file)
         logger.info(f"Audio file size: {file_size} bytes")
         
-        audio = AudioSegment.from_wav(audio_file)
-        total_duration = len(audio)
-        segment_duration = 60000  # 60秒
-        total_segments = (total_duration + segment_duration - 1) // segment_duration
+        if segment_infos is None:
+            segment_infos = plan_segments(wav_duration_ms(audio_file))
+        total_segments = len(segment_infos)
+        if total_segments == 0:
+            return []
 
         processed_segments = []
         recognizer = sr.Recognizer()
@@ -67,37 +155,55 @@ def transcribe_audio(audio_file, progress_callback):
                                   progress_callback=progress_callback, 
                                   total_segments=total_segments,
                                   processed_segments=processed_segments,
-                                  audio_file=audio_file)
-
-        segment_infos = [(i, i*segment_duration, min(segment_duration, total_duration-i*segment_duration)) 
-                         for i in range(total_segments)]
+                                  audio_file=audio_file,
+                                  deadline=deadline)
 
-        results = []
+        results = {}
         with concurrent.futures.ThreadPoolExecutor(max_workers=min(os.cpu_count(), total_segments)) as executor:
             future_to_segment = {executor.submit(transcribe_func, segment_info): segment_info for segment_info in segment_infos}
             for future in concurrent.futures.as_completed(future_to_segment):
                 segment_info = future_to_segment[future]
                 try:
-                    result = future.result()
-                    results.append(result)
+                    index, text, status = future.result()
                 except Exception as exc:
                     logger.error(f'セグメント {segment_info} の処理中に例外が発生しました: {exc}', exc_info=True)
+                    index, text, status = segment_info[0], ERROR_PLACEHOLDER.format(error=str(exc)), SEGMENT_ERROR
+                results[index] = (text, status)
+
+        if deadline is not None and deadline.cancelled:
+            check_deadline(deadline)
+        if deadline is not None and deadline.expired():
+            logger.warning("処理の制限時間を超えたため、認識できたセグメントのみを返します")
 
-        logger.debug("文字起こし結果をソートして結合中")
-        sorted_results = sorted(results, key=lambda x: x[0])
-        transcription = " ".join(text for _, text in sorted_results)
+        segments = [
+            {'index': index, 'start': start, 'end': start + duration,
+             'text': results[index][0], 'status': results[index][1]}
+            for index, start, duration in sorted(segment_infos)
+        ]
 
         end_time = time.time()
         end_memory = get_memory_usage()
         logger.info(f"文字起こしが完了しました. 処理時間: {end_time - start_time:.2f}秒, "
                     f"合計メモリ使用量変化: {end_memory - start_memory:.2f}MB")
 
-        return transcription
+        return segments
 
     except Exception as e:
         logger.error(f"文字起こし処理中に予期せぬエラーが発生しました: {str(e)}", exc_info=True)
         raise
 
+def join_segments(segments):
+    """セグメントのテキストを連結して文字起こし全体のテキストにする"""
+    return " ".join(segment['text'] for segment in segments)
+
+def transcribe_audio(audio_file, progress_callback, deadline=None):
+    """
+    音声ファイルを60秒ごとのセグメントに分けて並列に文字起こしし、テキストを返す関数
+
+    タイムスタンプ付きのセグメントが必要な場合は transcribe_segments を使用する。
+    """
+    return join_segments(transcribe_segments(audio_file, progress_callback, deadline))
+
 if __name__ == "__main__":
     def dummy_progress_callback(progress):
         print(f"進捗: {progress:.2f}%")
@@ -1,75 +1,151 @@
 # upload_service.py
 
 import os
+import time
 import uuid
 from werkzeug.utils import secure_filename
-from flask import session, render_template_string
 from services.audio_service import convert_to_wav
-from services.transcription_service import transcribe_audio
-from services.minutes_service import generate_minutes
-from services.openai_miniutes_service import openai_generate_minutes
-from services.gemni_miniutes_service import gemini_generate_minutes
+from services.transcription_service import transcribe_segments, join_segments
+from services.transcript_store import save_transcript, save_minutes, failed_segment_indexes
+from services.pipeline_service import generate_minutes_with_fallback, render_minutes_html
+from services.archive_service import archive_meeting
+from services.storage_service import get_storage
+from services.preflight_service import preflight, PreflightError
+from services.eta_service import estimate_processing_time, record_timings
+from services.profiling_service import profile_stage
+from services.lifecycle_service import track_job, update_job
+from services.deadline_service import JobCancelledError, new_job_deadline
 from logger import app_logger
 
-def process_upload(file, upload_folder, allowed_extensions, socketio):
+def process_upload(file, upload_folder, allowed_extensions, notify, owner=None, session_id=None):
+    """
+    アップロードされたファイルを変換・文字起こしし、議事録を生成する関数
+
+    Flaskのセッションには依存しないため、生成された議事録の保存は呼び出し側で行う。
+
+    Args:
+        file: アップロードされたファイル (werkzeug.datastructures.FileStorage)
+        upload_folder (str): ファイルを保存するフォルダ
+        allowed_extensions (set): アップロードを許可する拡張子
+        notify (callable): 進捗通知用のコールバック notify(event, data)
+        owner (str): 処理を要求したクライアントの Socket.IO セッションID。切断時に処理をキャンセルする
+        session_id (str): 処理を要求したブラウザのセッションID。ジョブと結果の所有者として記録する
+
+    Returns:
+        tuple: (文字起こし, 議事録, 議事録のHTML, プロンプトのバージョン, 文字起こしのID, エラーメッセージ)
+    """
     app_logger.debug(f"Received file: {file.filename}, Size: {file.content_length} bytes, Content-Type: {file.content_type}")
     if not file or file.filename == '':
-        return None, None, 'ファイルが選択されていません'
+        return None, None, None, None, None, 'ファイルが選択されていません'
 
     if not allowed_file(file.filename, allowed_extensions):
-        return None, None, '許可されていないファイル形式です'
+        return None, None, None, None, None, '許可されていないファイル形式です'
 
     try:
-        unique_filename = str(uuid.uuid4()) + '_' + secure_filename(file.filename)
-        filepath = os.path.join(upload_folder, unique_filename)
-        file.save(filepath)
-        app_logger.info(f"File saved: {filepath}")
+        storage = get_storage()
+        with profile_stage('saving'):
+            filepath = save_upload(file, upload_folder)
 
-        socketio.emit('status_update', {'status': 'ファイルを変換中...'})
-        try:
-            wav_file = convert_to_wav(filepath, upload_folder)
-            app_logger.info(f"File converted to WAV: {wav_file}")
-        except Exception as e:
-            app_logger.error(f"Error converting file to WAV: {str(e)}", exc_info=True)
-            return None, None, f"音声ファイルの変換中にエラーが発生しました: {str(e)}"
-
-        socketio.emit('status_update', {'status': '音声認識を開始します...'})
-        def progress_callback(progress):
-            socketio.emit('transcription_progress', {'progress': progress})
-        
+        # 変換や音声認識を始める前に、デコードできないファイルや無音のファイルを拒否する
         try:
-            transcription = transcribe_audio(wav_file, progress_callback)
-            app_logger.info("Transcription completed")
-        except Exception as e:
-            app_logger.error(f"Error during transcription: {str(e)}", exc_info=True)
-            return None, None, f"音声認識中にエラーが発生しました: {str(e)}"
-
-        for generate_func, api_name in [
-            (gemini_generate_minutes, "Gemini API"), 
-            (openai_generate_minutes, "ChatGPT API"), 
-            (generate_minutes, "Claude API")
-        ]:
-            socketio.emit('status_update', {'status': f'{api_name} を使用して議事録を生成中...'})
-            minutes = generate_func(transcription)
-            if minutes and minutes != "議事録の生成中にエラーが発生しました。":
-                socketio.emit('api_used', {'api_name': api_name})
-                break
-        else:
-            raise Exception("全ての議事録生成ツールでエラーが発生しました。")
-
-        session['minutes'] = minutes
-        minutes_html = render_template_string("{{ minutes|markdown }}", minutes=minutes)
+            with profile_stage('preflight'):
+                media = preflight(filepath)
+        except PreflightError as e:
+            app_logger.warning(f"Upload rejected by preflight: {file.filename}: {str(e)}")
+            os.remove(filepath)
+            return None, None, None, None, None, f"このファイルは処理できません: {str(e)}"
+        duration = media['duration'] if media else None
+        notify('preflight', dict(media or {}, filename=file.filename, eta=estimate_processing_time(duration)))
+
+        with profile_stage('saving'):
+            upload_key = storage.publish(filepath)
+
+        # 終了処理中に完了しなかった場合に再開できるよう、ステージごとに進捗を記録する
+        deadline = new_job_deadline()
+        with track_job('upload', 'converting', owner=owner, deadline=deadline, filename=file.filename,
+                       upload_key=upload_key, upload_folder=upload_folder, session_id=session_id) as job_id:
+            notify('job_started', {'job_id': job_id})
+            notify('status_update', {'status': 'ファイルを変換中...'})
+            # 処理時間の推定に使用するため、ステージごとの所要時間を記録する
+            timings = {}
+            stage_start = time.perf_counter()
+            try:
+                with profile_stage('converting'):
+                    wav_file = convert_to_wav(filepath, upload_folder, deadline=deadline, duration=duration)
+                    wav_key = storage.publish(wav_file)
+                timings['converting'] = time.perf_counter() - stage_start
+                app_logger.info(f"File converted to WAV: {wav_file}")
+            except JobCancelledError:
+                raise
+            except Exception as e:
+                app_logger.error(f"Error converting file to WAV: {str(e)}", exc_info=True)
+                return None, None, None, None, None, f"音声ファイルの変換中にエラーが発生しました: {str(e)}"
+
+            update_job(job_id, 'transcribing', wav_key=wav_key)
+            notify('status_update', {'status': '音声認識を開始します...'})
+            def progress_callback(progress):
+                notify('transcription_progress', {'progress': progress})
+            
+            stage_start = time.perf_counter()
+            try:
+                with profile_stage('transcribing'):
+                    segments = transcribe_segments(wav_file, progress_callback, deadline)
+                timings['transcribing'] = time.perf_counter() - stage_start
+                transcription = join_segments(segments)
+                app_logger.info("Transcription completed")
+            except JobCancelledError:
+                raise
+            except Exception as e:
+                app_logger.error(f"Error during transcription: {str(e)}", exc_info=True)
+                return None, None, None, None, None, f"音声認識中にエラーが発生しました: {str(e)}"
+
+            # 一部の区間だけを後から再認識できるよう、セグメント索引を保存する
+            with profile_stage('indexing'):
+                transcript_id = save_transcript(segments, wav_key, filename=file.filename, session_id=session_id)
+            notify('transcript_saved', {
+                'transcript_id': transcript_id,
+                'failed_segments': len(failed_segment_indexes(segments))
+            })
+
+            update_job(job_id, 'generating', transcription=transcription, transcript_id=transcript_id)
+            stage_start = time.perf_counter()
+            with profile_stage('generating'):
+                minutes, api_name, prompt_version = generate_minutes_with_fallback(
+                    transcription, notify, deadline, segments=[segment['text'] for segment in segments])
+            timings['generating'] = time.perf_counter() - stage_start
+            record_timings(duration, timings)
+            save_minutes(transcript_id, minutes, transcription, api_name, prompt_version)
+
+        # 後から検索できるよう、文字起こしと議事録をアーカイブに追加する
+        with profile_stage('archiving'):
+            archive_meeting(transcript_id, filename=file.filename, transcription=transcription, minutes=minutes,
+                            api_name=api_name, prompt_version=prompt_version, session_id=session_id)
+
+        with profile_stage('rendering'):
+            minutes_html = render_minutes_html(minutes)
 
         # os.remove(filepath)
         # os.remove(wav_file)
 
-        socketio.emit('status_update', {'status': '処理が完了しました'})
-        return transcription, minutes_html, None
+        notify('status_update', {'status': '処理が完了しました'})
+        return transcription, minutes, minutes_html, prompt_version, transcript_id, None
+
+    except JobCancelledError as e:
+        app_logger.info(f"Upload processing stopped: {str(e)}")
+        return None, None, None, None, None, str(e)
 
     except Exception as e:
         error_message = f"ファイル処理中に予期せぬエラーが発生しました: {str(e)}"
         app_logger.error(error_message, exc_info=True)
-        return None, None, error_message
+        return None, None, None, None, None, error_message
+
+def save_upload(file, upload_folder):
+    """アップロードされたファイルを一意なファイル名で保存し、保存先のパスを返す"""
+    unique_filename = str(uuid.uuid4()) + '_' + secure_filename(file.filename)
+    filepath = os.path.join(upload_folder, unique_filename)
+    file.save(filepath)
+    app_logger.info(f"File saved: {filepath}")
+    return filepath
 
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
\ No newline at end of file
@@ -0,0 +1,50 @@
+# tests/test_compaction_service.py
+
+import unittest
+from services.compaction_service import compact_transcript
+
+def compact(text, segments=None):
+    return compact_transcript(text, segments)[0]
+
+class FillerTest(unittest.TestCase):
+
+    def test_delimited_filler_is_removed_with_comma(self):
+        self.assertEqual(compact("あの、それで予算の話です。"), "それで予算の話です。")
+
+    def test_elongated_filler_is_removed(self):
+        self.assertEqual(compact("えーと、予算の話です。"), "予算の話です。")
+
+    def test_word_ending_is_not_filler(self):
+        self.assertEqual(compact("じゃあー始めます。"), "じゃあー始めます。")
+
+class RepeatTest(unittest.TestCase):
+
+    def test_delimited_repeat_is_collapsed(self):
+        self.assertEqual(compact("はい、はい、はい。"), "はい。")
+
+    def test_reduplicated_words_are_kept(self):
+        self.assertEqual(compact("いろいろ なかなか"), "いろいろ なかなか")
+
+class BoundaryOverlapTest(unittest.TestCase):
+
+    def test_overlap_at_segment_join_is_removed(self):
+        segments = ["今日は予算について話します", "について話します。次に人事です"]
+        text, stats = compact_transcript(' '.join(segments), segments)
+        self.assertEqual(text, "今日は予算について話します 。次に人事です")
+        self.assertEqual(stats['removed_boundary_overlaps'], 1)
+
+    def test_words_within_segment_are_kept(self):
+        self.assertEqual(compact("data database"), "data database")
+        self.assertEqual(compact("Python Python3"), "Python Python3")
+        self.assertEqual(compact("予算案 予算案の修正"), "予算案 予算案の修正")
+
+    def test_alphanumeric_overlap_at_segment_join_is_kept(self):
+        segments = ["次は data", "database の移行です"]
+        self.assertEqual(compact(' '.join(segments), segments), "次は data database の移行です")
+
+    def test_short_overlap_at_segment_join_is_kept(self):
+        segments = ["2024 年度の予算", "予算案を承認しました"]
+        self.assertEqual(compact(' '.join(segments), segments), "2024 年度の予算 予算案を承認しました")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# tests/test_regeneration_service.py
+
+import unittest
+from unittest import mock
+from services import regeneration_service
+from services.regeneration_service import diff_transcripts, find_substitutions, regenerate_incremental
+
+MINUTES = (
+    "# 定例会議\n"
+    "\n"
+    "## 予算\n"
+    "- 田中さんが予算案を説明した。これは承認済みです。\n"
+    "\n"
+    "## 次回の予定\n"
+    "- 次回の会議は来週です。\n"
+)
+
+SOURCE = "田中さんが予算案を説明しました。これは承認済みです。次回の会議は来週です。"
+
+class FindSubstitutionsTest(unittest.TestCase):
+
+    def substitutions(self, new_transcription, minutes=MINUTES, source=SOURCE):
+        return find_substitutions(diff_transcripts(source, new_transcription), minutes, new_transcription)
+
+    def test_name_fix_is_substitution(self):
+        new = SOURCE.replace("田中", "中田")
+        self.assertEqual(self.substitutions(new), [("田中", "中田")])
+
+    def test_kanji_word_fix_is_substitution(self):
+        new = SOURCE.replace("来週", "来月")
+        self.assertEqual(self.substitutions(new), [("来週", "来月")])
+
+    def test_hiragana_ending_is_not_substitution(self):
+        new = SOURCE.replace("承認済みです", "承認済みでした")
+        self.assertIsNone(self.substitutions(new))
+
+    def test_particle_is_not_substitution(self):
+        new = SOURCE.replace("これは", "これが")
+        self.assertIsNone(self.substitutions(new))
+
+    def test_single_character_is_not_substitution(self):
+        new = SOURCE.replace("次回の会議", "次回の会")
+        self.assertIsNone(self.substitutions(new))
+
+    def test_word_missing_from_minutes_is_not_substitution(self):
+        new = SOURCE.replace("予算案", "補正案")
+        self.assertIsNone(self.substitutions(new, MINUTES.replace("予算案", "予算")))
+
+    def test_partial_name_fix_is_not_substitution(self):
+        source = SOURCE + "田中さんは賛成しました。"
+        new = source.replace("田中", "中田", 1)
+        minutes = MINUTES + "- 田中さんは賛成した。\n"
+        self.assertIsNone(self.substitutions(new, minutes, source))
+
+    def test_compound_word_in_minutes_is_not_substitution(self):
+        new = SOURCE.replace("次回の会議", "次回の会談")
+        minutes = MINUTES.replace("来週です。", "来週、会議室で行う。")
+        self.assertIsNone(self.substitutions(new, minutes))
+
+    def test_word_in_heading_is_not_substitution(self):
+        new = SOURCE.replace("次回の会議", "次回の会談")
+        self.assertIsNone(self.substitutions(new))
+
+class RegenerateIncrementalTest(unittest.TestCase):
+
+    def test_name_fix_replaces_only_the_name(self):
+        result = regenerate_incremental(MINUTES, SOURCE, SOURCE.replace("田中", "中田"))
+        self.assertEqual(result['mode'], 'substitution')
+        self.assertEqual(result['minutes'], MINUTES.replace("田中", "中田"))
+
+    def test_hiragana_ending_regenerates_section(self):
+        new = SOURCE.replace("承認済みです", "承認済みでした")
+        generated = ("## 予算\n- 田中さんが予算案を説明した。これは承認済みでした。", 'Gemini', 'section-v1')
+        with mock.patch.object(regeneration_service, 'generate_minutes_with_fallback',
+                               return_value=generated) as generate:
+            result = regenerate_incremental(MINUTES, SOURCE, new)
+        self.assertEqual(result['mode'], 'sections')
+        self.assertEqual(result['sections'], ['## 予算'])
+        self.assertEqual(generate.call_count, 1)
+        self.assertIn("次回の会議は来週です。", result['minutes'])
+
+    def test_partial_name_fix_keeps_other_occurrences(self):
+        source = SOURCE + "田中さんは賛成しました。"
+        new = source.replace("田中", "中田", 1)
+        minutes = MINUTES.replace("## 次回の予定", "## 決定事項\n- 田中さんは賛成した。\n\n## 次回の予定")
+        generated = ("## 予算\n- 中田さんが予算案を説明した。これは承認済みです。", 'Gemini', 'section-v1')
+        with mock.patch.object(regeneration_service, 'generate_minutes_with_fallback', return_value=generated):
+            result = regenerate_incremental(minutes, source, new)
+        self.assertEqual(result['mode'], 'sections')
+        self.assertIn("中田さんが予算案を説明した。", result['minutes'])
+        self.assertIn("田中さんは賛成した。", result['minutes'])
+
+if __name__ == '__main__':
+    unittest.main()